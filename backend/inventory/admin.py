@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
-from .models import Product, AuditLog, User
+from .models import Product, AuditLog, User, InboundTransaction, OutboundTransaction, CycleCount, CountSession
 
 # Extend default UserAdmin to include 'role'
 @admin.register(User)
@@ -13,6 +13,33 @@ class UserAdmin(BaseUserAdmin):
     list_filter = ["role", "is_staff", "is_superuser"]
 
 admin.site.register(Product)
-admin.site.register(AuditLog)
 
+# These models' __str__ reads product.name, so changelists join the product
+# instead of fetching it once per row, and the product picker is a raw id.
 
+@admin.register(AuditLog)
+class AuditLogAdmin(admin.ModelAdmin):
+    list_display = ["__str__", "source_type", "source_id"]
+    list_select_related = ["product"]
+    raw_id_fields = ["product"]
+
+@admin.register(InboundTransaction)
+class InboundTransactionAdmin(admin.ModelAdmin):
+    list_select_related = ["product"]
+    raw_id_fields = ["product"]
+
+@admin.register(OutboundTransaction)
+class OutboundTransactionAdmin(admin.ModelAdmin):
+    list_select_related = ["product"]
+    raw_id_fields = ["product"]
+
+@admin.register(CycleCount)
+class CycleCountAdmin(admin.ModelAdmin):
+    list_select_related = ["product"]
+    raw_id_fields = ["product", "session"]
+
+@admin.register(CountSession)
+class CountSessionAdmin(admin.ModelAdmin):
+    list_display = ["__str__", "name", "started_at", "reconciled_at"]
+    list_filter = ["status"]
+    raw_id_fields = ["created_by"]
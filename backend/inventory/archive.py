@@ -0,0 +1,114 @@
+import csv
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog, AuditArchive
+
+# Old AuditLog rows are moved into one gzip CSV per calendar month, listed in
+# AuditArchive, so the hot table only holds the retention window. Rows are
+# read in keyset batches and only deleted once their file is saved; a run that
+# dies half way is finished off by the next one (purge_archived).
+
+ARCHIVE_FIELDS = [
+    ('id', 'id'), ('product_id', 'product_id'), ('sku', 'product__sku'), ('product_name', 'product__name'),
+    ('action', 'action'), ('timestamp', 'timestamp'), ('performed_by', 'performed_by'),
+    ('changes', 'changes'), ('source_type', 'source_type'), ('source_id', 'source_id'),
+]
+
+
+def get_retention_days():
+    return getattr(settings, 'AUDIT_RETENTION_DAYS', 365)
+
+def month_bounds(moment):
+    start = moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+def archive_row(values):
+    row = dict(zip([column for column, _ in ARCHIVE_FIELDS], values))
+    row['timestamp'] = row['timestamp'].isoformat()
+    row['changes'] = json.dumps(row['changes'], cls=DjangoJSONEncoder)
+    return row.values()
+
+def purge_archived(archives=None, batch_size=5000):
+    """Delete hot rows already copied into `archives` (default: all of them), in bounded batches."""
+    deleted = 0
+    for archive in archives if archives is not None else AuditArchive.objects.all():
+        rows = AuditLog.objects.filter(timestamp__gte=archive.start, timestamp__lt=archive.end, id__lte=archive.last_id)
+        while ids := list(rows.values_list('id', flat=True)[:batch_size]):
+            deleted += AuditLog.objects.filter(id__in=ids).delete()[0]
+    return deleted
+
+def archive_range(start, end, batch_size=5000):
+    rows = AuditLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    last_id = 0
+    count = 0
+    with tempfile.TemporaryFile() as tmp:
+        with gzip.open(tmp, 'wt', newline='') as gz:
+            writer = csv.writer(gz)
+            writer.writerow([column for column, _ in ARCHIVE_FIELDS])
+            while batch := list(
+                rows.filter(id__gt=last_id).order_by('id').values_list(*[lookup for _, lookup in ARCHIVE_FIELDS])[:batch_size]
+            ):
+                writer.writerows(archive_row(row) for row in batch)
+                last_id = batch[-1][0]
+                count += len(batch)
+        if not count:
+            return None
+
+        tmp.seek(0)
+        archive = AuditArchive(start=start, end=end, last_id=last_id, row_count=count)
+        archive.file.save(f'audit-{start:%Y-%m}.csv.gz', File(tmp), save=True)
+    purge_archived([archive], batch_size)
+    return archive
+
+def archive_audit_logs(before=None, batch_size=5000):
+    """Archive every AuditLog row older than `before` (default: the retention window). Returns the new archives."""
+    before = before or timezone.now() - timedelta(days=get_retention_days())
+    purge_archived(batch_size=batch_size)
+
+    archives = []
+    while True:
+        oldest = AuditLog.objects.filter(timestamp__lt=before).order_by('timestamp').values_list('timestamp', flat=True).first()
+        if oldest is None:
+            break
+        start, end = month_bounds(oldest)
+        archive = archive_range(start, min(end, before), batch_size)
+        if archive is None:
+            break
+        archives.append(archive)
+    return archives
+
+
+# -----------------------
+# Read path
+# -----------------------
+
+def read_archive(start=None, end=None, product_id=None):
+    """Yield archived rows (as dicts) with start <= timestamp <= end, opening only the overlapping files."""
+    archives = AuditArchive.objects.order_by('start', 'id')
+    if start:
+        archives = archives.filter(end__gt=start)
+    if end:
+        archives = archives.filter(start__lte=end)
+
+    for archive in archives:
+        with archive.file.open('rb') as file, gzip.open(file, 'rt', newline='') as gz:
+            for row in csv.DictReader(gz):
+                timestamp = parse_datetime(row['timestamp'])
+                if (start and timestamp < start) or (end and timestamp > end):
+                    continue
+                if product_id and row['product_id'] != str(product_id):
+                    continue
+                row['changes'] = json.loads(row['changes'])
+                for key in ('id', 'product_id', 'source_id'):
+                    row[key] = int(row[key]) if row[key] else None
+                yield row
@@ -0,0 +1,169 @@
+import atexit
+import logging
+import queue
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from .models import AuditLog, Product, InboundTransaction, OutboundTransaction, CycleCount
+from .dashboard import invalidate_summary
+
+logger = logging.getLogger(__name__)
+
+# Audit entries are buffered per transaction and written with one bulk_create
+# once it commits, so a request or upload batch costs one INSERT however many
+# products it touched, and entries from a rolled-back transaction (or
+# savepoint) are never written (see PendingEntries). In 'background' mode the committed entries
+# are handed to a writer thread instead, trading a small window of loss on a
+# crash for no audit write on the request path at all.
+
+
+SOURCE_TYPES = {
+    InboundTransaction: 'inbound',
+    OutboundTransaction: 'outbound',
+    CycleCount: 'cycle_count',
+}
+
+
+def make_entry(product, action, username, changes=None, source=None):
+    return AuditLog(
+        product=product,
+        action=action,
+        performed_by=username,
+        changes=changes or {},
+        source_type=SOURCE_TYPES[type(source)] if source is not None else '',
+        source_id=source.pk if source is not None else None,
+    )
+
+def diff(before, after):
+    """{"field": [old, new]} for the fields of `after` whose value differs from `before`."""
+    return {field: [before.get(field), value] for field, value in after.items() if before.get(field) != value}
+
+def stock_change(product, delta):
+    # product.quantity is the value just after the change was applied.
+    return {'quantity': [product.quantity - delta, product.quantity]}
+
+
+def get_flush_mode():
+    return getattr(settings, 'AUDIT_FLUSH_MODE', 'commit')
+
+def get_batch_size():
+    return getattr(settings, 'AUDIT_BATCH_SIZE', 1000)
+
+
+def write_entries(entries):
+    if not entries:
+        return
+    # A product deleted in the same transaction takes its audit rows with it
+    # (the FK cascades), so its pending entries are dropped the same way.
+    alive = set(Product.objects.filter(pk__in={e.product_id for e in entries}).values_list('pk', flat=True))
+    AuditLog.objects.bulk_create([e for e in entries if e.product_id in alive], batch_size=get_batch_size())
+    invalidate_summary()
+
+def flush(entries):
+    if get_flush_mode() == 'background':
+        get_writer().put(entries)
+    else:
+        write_entries(entries)
+
+
+class PendingEntries:
+    """
+    One record() call's entries, registered with transaction.on_commit().
+
+    Django discards the callback when its savepoint or transaction rolls back,
+    and with it the only strong reference to this object; the thread-local
+    list of pending batches holds weak references, so it sees exactly the
+    batches that will commit. The first callback to run writes all of them in
+    one go and the rest find nothing left to do.
+    """
+
+    def __init__(self, alias, entries):
+        self.alias = alias
+        self.entries = entries
+
+    def __call__(self):
+        pending = pending_batches(self.alias)
+        entries = [entry for ref in pending if (batch := ref()) is not None for entry in batch.entries]
+        pending.clear()
+        if entries:
+            flush(entries)
+
+
+_local = threading.local()
+
+
+def pending_batches(alias):
+    if not hasattr(_local, 'pending'):
+        _local.pending = {}
+    return _local.pending.setdefault(alias, [])
+
+def record(entries, using=None):
+    """Queue unsaved AuditLog instances; written once the current transaction commits."""
+    if not entries:
+        return
+    conn = transaction.get_connection(using)
+    if not conn.in_atomic_block:
+        flush(list(entries))
+        return
+    pending = pending_batches(conn.alias)
+    # Batches from rolled-back transactions are already gone.
+    pending[:] = [ref for ref in pending if ref() is not None]
+    batch = PendingEntries(conn.alias, list(entries))
+    pending.append(weakref.ref(batch))
+    transaction.on_commit(batch, using=conn.alias)
+
+
+# -----------------------
+# Background writer
+# -----------------------
+
+class AuditWriter:
+    def __init__(self, interval=1.0, batch_size=1000):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self.run, name='audit-writer', daemon=True)
+        self.thread.start()
+
+    def put(self, entries):
+        self.queue.put(entries)
+
+    def run(self):
+        while True:
+            batch = self.queue.get()
+            try:
+                # Gather whatever else arrived within the interval.
+                while len(batch) < self.batch_size:
+                    try:
+                        batch.extend(self.queue.get(timeout=self.interval))
+                        self.queue.task_done()
+                    except queue.Empty:
+                        break
+                close_old_connections()
+                write_entries(batch)
+            except Exception:
+                logger.exception("Failed to write %s audit entries", len(batch))
+            finally:
+                self.queue.task_done()
+
+    def drain(self):
+        self.queue.join()
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_writer():
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = AuditWriter(
+                interval=getattr(settings, 'AUDIT_FLUSH_INTERVAL', 1.0),
+                batch_size=get_batch_size()
+            )
+            atexit.register(_writer.drain)
+        return _writer
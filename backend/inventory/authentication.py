@@ -0,0 +1,46 @@
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .permissions import claims_current
+
+# With JWT_STATELESS_AUTH on, a request's user is built from the token's signed
+# claims (user id, username, role) instead of a SELECT on the user table. The
+# row is still loaded when the claims can't be trusted: tokens issued before
+# the claims existed, or whose roles_changed_at no longer matches the user's
+# (see inventory.permissions). Deactivating a user moves that stamp, so their
+# next request loads the row and is refused by JWTAuthentication.
+
+
+class ClaimsUser(TokenUser):
+    """A user backed by validated token claims; anything the claims don't carry is read from the User row."""
+
+    def __str__(self):
+        return self.username
+
+    @cached_property
+    def role(self):
+        return self.token['role']
+
+    @cached_property
+    def user(self):
+        return User.objects.get(pk=self.pk)
+
+    @property
+    def groups(self):
+        return self.user.groups
+
+    def __getattr__(self, name):
+        if name.startswith('_') or name == 'token':
+            raise AttributeError(name)
+        return getattr(self.user, name)
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or 'role' not in validated_token or not claims_current(user_id, validated_token):
+            return super().get_user(validated_token)
+        return ClaimsUser(validated_token)
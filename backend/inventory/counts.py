@@ -0,0 +1,165 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Product, CountSession, CountLine, CycleCount
+from .ingest import LOOKUP_CHUNK_SIZE, batched, clean_count_row, dedupe_by_sku, run_ingest
+from .stock import UPDATE_CHUNK_SIZE, record_movements
+from .utils import log_audit_bulk
+from .dashboard import invalidate_summary
+
+SNAPSHOT_CHUNK_SIZE = 2000
+
+# A count session freezes each product's stock when it opens. Counts are
+# recorded against the session without touching Product, so inbound and
+# outbound keep running while people count, and reconciling applies
+# `counted - snapshot` as a delta to live stock: whatever moved in the
+# meantime is kept rather than overwritten by the count.
+
+
+class SessionClosed(Exception):
+    def __init__(self, session):
+        self.session = session
+        super().__init__(f"Count session #{session.pk} is {session.status}.")
+
+
+def open_session(products, name='', user=None):
+    """Open a session over `products` (a queryset) with their stock as of now."""
+    with transaction.atomic():
+        session = CountSession.objects.create(
+            name=name, created_by_id=user.pk if user and user.is_authenticated else None
+        )
+        # A single SELECT, so every line comes from the same database snapshot.
+        rows = products.order_by('pk').values_list('pk', 'quantity').iterator(chunk_size=SNAPSHOT_CHUNK_SIZE)
+        for batch in batched(rows, SNAPSHOT_CHUNK_SIZE):
+            CountLine.objects.bulk_create(
+                [CountLine(session=session, product_id=pk, snapshot_quantity=quantity) for pk, quantity in batch]
+            )
+    return session
+
+def locked_open_session(session):
+    session = CountSession.objects.select_for_update().get(pk=session.pk)
+    if session.status != 'open':
+        raise SessionClosed(session)
+    return session
+
+
+# -----------------------
+# Counting
+# -----------------------
+
+def apply_session_counts(batch, report, user=None, session=None):
+    # A recount of a SKU replaces its earlier count.
+    rows = dedupe_by_sku(batch, report)
+    skus = list(rows)
+    lines = {}
+    for i in range(0, len(skus), LOOKUP_CHUNK_SIZE):
+        qs = session.lines.filter(product__sku__in=skus[i:i + LOOKUP_CHUNK_SIZE]).annotate(sku=F('product__sku'))
+        lines.update((line.sku, line) for line in qs)
+
+    counted_by = user.username if user and user.is_authenticated else 'admin'
+    now = timezone.now()
+    counted = []
+    for sku, (line_no, fields) in rows.items():
+        line = lines.get(sku)
+        if line is None:
+            report.reject(line_no, sku, f"SKU '{sku}' is not part of this count")
+            continue
+        line.counted_quantity = fields['counted_quantity']
+        line.counted_by = counted_by
+        line.counted_at = now
+        counted.append(line)
+
+    CountLine.objects.bulk_update(counted, ['counted_quantity', 'counted_by', 'counted_at'], batch_size=UPDATE_CHUNK_SIZE)
+    report.accepted += len(counted)
+
+def record_counts(session, rows, user=None, **options):
+    """Record (sku, counted_quantity) rows against an open session; stock is untouched until reconcile_session()."""
+    with transaction.atomic():
+        session = locked_open_session(session)
+        return run_ingest(rows, clean_count_row, partial(apply_session_counts, session=session), user, **options)
+
+
+# -----------------------
+# Reconciliation
+# -----------------------
+
+def reconcile_lines(session, lines, summary, user=None):
+    # `lines` are (product_id, snapshot, counted, counted_by) in product order;
+    # the products are locked in that order too.
+    discrepancies = {product_id: counted - snapshot for product_id, snapshot, counted, _ in lines}
+    moved = [product_id for product_id, delta in discrepancies.items() if delta]
+    products = Product.objects.select_for_update().order_by('pk').in_bulk(moved)
+
+    now = timezone.now()
+    counts = []
+    changes = []
+    deltas = {}
+    for product_id, snapshot, counted, counted_by in lines:
+        discrepancy = discrepancies[product_id]
+        counts.append(CycleCount(
+            product_id=product_id, session=session, counted_quantity=counted, system_quantity=snapshot,
+            discrepancy=discrepancy, adjusted=bool(discrepancy), counted_by=counted_by or 'admin',
+        ))
+        if not discrepancy:
+            summary['matched'] += 1
+            continue
+        summary['over' if discrepancy > 0 else 'short'] += 1
+        summary['units_over' if discrepancy > 0 else 'units_short'] += abs(discrepancy)
+        summary['net_discrepancy'] += discrepancy
+
+        product = products.get(product_id)
+        if product is None:
+            continue
+        if product.quantity != snapshot:
+            summary['moved_since_snapshot'] += 1
+        live = product.quantity
+        # Stock that left after the snapshot can make the adjusted figure
+        # negative; it is floored at zero and reported.
+        product.quantity = max(live + discrepancy, 0)
+        if live + discrepancy < 0:
+            summary['floored'] += 1
+        product.updated_at = now
+        deltas[product_id] = product.quantity - live
+        changes.append((product, {'quantity': [live, product.quantity]}))
+
+    CycleCount.objects.bulk_create(counts, batch_size=UPDATE_CHUNK_SIZE)
+    Product.objects.bulk_update([product for product, _ in changes], ['quantity', 'updated_at'], batch_size=UPDATE_CHUNK_SIZE)
+    record_movements(deltas, 'count')
+    sources = {count.product_id: count for count in counts}
+    log_audit_bulk([(product, change, sources[product.pk]) for product, change in changes], 'update', user)
+
+def reconcile_session(session, user=None):
+    """Apply every counted line's `counted - snapshot` to live stock and close the session."""
+    with transaction.atomic():
+        session = locked_open_session(session)
+        summary = dict.fromkeys(
+            ['lines', 'counted', 'uncounted', 'matched', 'over', 'short', 'units_over', 'units_short',
+             'net_discrepancy', 'moved_since_snapshot', 'floored'], 0
+        )
+        summary['lines'] = session.lines.count()
+
+        lines = (
+            session.lines.filter(counted_quantity__isnull=False).order_by('product_id')
+            .values_list('product_id', 'snapshot_quantity', 'counted_quantity', 'counted_by')
+        )
+        for batch in batched(lines.iterator(chunk_size=UPDATE_CHUNK_SIZE), UPDATE_CHUNK_SIZE):
+            summary['counted'] += len(batch)
+            reconcile_lines(session, batch, summary, user)
+        summary['uncounted'] = summary['lines'] - summary['counted']
+
+        session.status = 'reconciled'
+        session.reconciled_at = timezone.now()
+        session.summary = summary
+        session.save(update_fields=['status', 'reconciled_at', 'summary'])
+    invalidate_summary()
+    return session
+
+def cancel_session(session):
+    with transaction.atomic():
+        session = locked_open_session(session)
+        session.status = 'cancelled'
+        session.save(update_fields=['status'])
+    return session
@@ -0,0 +1,86 @@
+import os
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import Product, InboundTransaction, OutboundTransaction, AuditLog
+
+SUMMARY_KEY = 'dashboard-summary:{date}'
+
+# Hit/miss counters are kept per process: writing shared counters to the
+# cache would cost a cache write on every hit and, on the file-based cache,
+# lose increments between workers.
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def get_timeout():
+    return getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 60)
+
+def _bump(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+def compute_summary(today):
+    products = Product.objects.aggregate(
+        total=Count('id'),
+        low_stock=Count('id', filter=Q(quantity__lte=F('low_stock_threshold')))
+    )
+    inbound_today = InboundTransaction.objects.filter(received_date=today).aggregate(total=Sum('quantity'))['total'] or 0
+    outbound_today = OutboundTransaction.objects.filter(dispatch_date=today).aggregate(total=Sum('quantity'))['total'] or 0
+
+    recent_activities = AuditLog.objects.order_by('-timestamp').values(
+        'product__name', 'action', 'performed_by', 'timestamp'
+    )[:10]
+    recent_data = [
+        {
+            'product': a['product__name'],
+            'action': a['action'],
+            'performed_by': a['performed_by'],
+            'timestamp': a['timestamp']
+        } for a in recent_activities
+    ]
+
+    return {
+        'total_products': products['total'],
+        'inbound_today': inbound_today,
+        'outbound_today': outbound_today,
+        'low_stock_alerts': products['low_stock'],
+        'recent_activities': recent_data
+    }
+
+def get_summary():
+    """Return (summary, hit). A cache hit costs no queries; the key includes the date so "today" rolls over."""
+    today = timezone.now().date()
+    key = SUMMARY_KEY.format(date=today)
+    summary = cache.get(key)
+    if summary is not None:
+        _bump('hits')
+        return summary, True
+
+    _bump('misses')
+    summary = compute_summary(today)
+    cache.set(key, summary, get_timeout())
+    return summary, False
+
+def invalidate_summary():
+    # Deferred to commit so a concurrent request can't re-cache pre-commit data.
+    key = SUMMARY_KEY.format(date=timezone.now().date())
+    transaction.on_commit(lambda: cache.delete(key))
+
+def get_cache_stats():
+    """Hit/miss counts of the process serving the request, since it started."""
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    total = hits + misses
+    return {
+        'pid': os.getpid(),
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / total, 3) if total else None,
+        'timeout_seconds': get_timeout(),
+    }
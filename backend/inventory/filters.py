@@ -0,0 +1,31 @@
+from django.contrib.postgres.lookups import TrigramWordSimilar
+from django.db import connection
+from django.db.models import Q
+from django.db.models.functions import Upper
+from rest_framework import filters
+
+
+class ProductSearchFilter(filters.SearchFilter):
+    """
+    SearchFilter for products backed by the pg_trgm GIN indexes on
+    UPPER(name/sku/category/tags) from migration 0006.
+
+    The plain substring search is unchanged; on PostgreSQL the indexes serve
+    it. ?fuzzy=true adds typo-tolerant matching on `fuzzy_fields` via trigram
+    word similarity, which the same indexes also serve. Other databases
+    (SQLite test runs) ignore ?fuzzy and do the plain substring search.
+    """
+    fuzzy_fields = ['name', 'tags']
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get('fuzzy') != 'true' or connection.vendor != 'postgresql':
+            return super().filter_queryset(request, queryset, view)
+
+        for term in self.get_search_terms(request):
+            match = Q()
+            for field in getattr(view, 'search_fields', []):
+                match |= Q(**{f'{field}__icontains': term})
+            for field in self.fuzzy_fields:
+                match |= TrigramWordSimilar(Upper(field), term.upper())
+            queryset = queryset.filter(match)
+        return queryset
@@ -0,0 +1,267 @@
+import csv
+import json
+import warnings
+from io import StringIO
+
+import numpy as np
+import pandas as pd
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .models import DailyVolume, ForecastState
+
+ROLLING_WINDOW = 7
+FORECAST_FIELDS = ['sku', 'product', 'stock', 'daily_average', 'forecast_days_left']
+
+
+def daily_usage_matrix(products):
+    """
+    Pivot outbound daily totals for `products` into a date x product_id matrix
+    (one query against the DailyVolume rollup). Days before a product's first
+    dispatch are NaN; gaps after it are 0.
+    """
+    rows = DailyVolume.objects.filter(direction='outbound', product__in=products).exclude(quantity=0).values_list(
+        'date', 'product_id', 'quantity'
+    )
+    df = pd.DataFrame(list(rows), columns=['date', 'product_id', 'quantity'])
+    if df.empty:
+        return pd.DataFrame()
+    df['date'] = pd.to_datetime(df['date'])
+    matrix = df.pivot_table(index='date', columns='product_id', values='quantity', aggfunc='sum').asfreq('D')
+    started = matrix.notna().cumsum() > 0
+    return matrix.fillna(0).where(started)
+
+# -----------------------
+# Forecasters
+# -----------------------
+# Every forecaster works on a whole date x product usage matrix at once (NaN
+# before a product's first dispatch) so it can run fleet-wide without a
+# Python loop over SKUs.
+
+class Forecaster:
+    name = None
+
+    def one_step(self, usage):
+        """Row t holds the forecast for day t + 1, using data up to day t."""
+        raise NotImplementedError
+
+    def daily_average(self, usage):
+        """Row t holds the expected average daily usage going forward from day t."""
+        return self.one_step(usage)
+
+
+class RollingMeanForecaster(Forecaster):
+    name = 'rolling_mean'
+
+    def __init__(self, window=ROLLING_WINDOW):
+        self.window = window
+
+    def one_step(self, usage):
+        # NaN days are left out of both sum and count, so a product with less
+        # history than the window is averaged over the days it has.
+        return usage.rolling(self.window, min_periods=1).mean()
+
+
+class ExponentialSmoothingForecaster(Forecaster):
+    name = 'exp_smoothing'
+
+    def __init__(self, alpha=0.3):
+        self.alpha = alpha
+
+    def one_step(self, usage):
+        return usage.ewm(alpha=self.alpha, adjust=False, ignore_na=True).mean()
+
+
+class SeasonalMovingAverageForecaster(Forecaster):
+    # Tomorrow looks like the same weekday over the last few weeks; falls back
+    # to the rolling mean until a product has a full week of history.
+    name = 'dow_seasonal'
+
+    def __init__(self, weeks=4):
+        self.weeks = weeks
+        self.fallback = RollingMeanForecaster()
+
+    def one_step(self, usage):
+        values = usage.to_numpy(dtype=float)
+        lags = np.full((self.weeks,) + values.shape, np.nan)
+        for k in range(1, self.weeks + 1):
+            lag = 7 * k - 1
+            if lag < len(values):
+                lags[k - 1, lag:] = values[:len(values) - lag]
+        with np.errstate(invalid='ignore'), warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            seasonal = np.nanmean(lags, axis=0)
+        forecast = pd.DataFrame(seasonal, index=usage.index, columns=usage.columns)
+        return forecast.fillna(self.fallback.one_step(usage)).where(usage.notna())
+
+    def daily_average(self, usage):
+        # Averaging the next seven weekday forecasts is a mean over whole weeks.
+        return usage.rolling(7 * self.weeks, min_periods=1).mean()
+
+
+FORECASTERS = {
+    forecaster.name: forecaster
+    for forecaster in [RollingMeanForecaster(), ExponentialSmoothingForecaster(), SeasonalMovingAverageForecaster()]
+}
+DEFAULT_FORECASTER = 'rolling_mean'
+
+
+def get_forecaster(name=None):
+    try:
+        return FORECASTERS[name or DEFAULT_FORECASTER]
+    except KeyError:
+        raise ValueError(f"Unknown forecast model '{name}'. Choose from {', '.join(FORECASTERS)}.")
+
+def value_at_last_dispatch(matrix, values):
+    # Forecasts are read on each product's last dispatch day.
+    dispatched = (matrix.fillna(0) > 0).to_numpy()
+    last = len(matrix) - 1 - np.argmax(dispatched[::-1], axis=0)
+    return pd.Series(values.to_numpy()[last, np.arange(matrix.shape[1])], index=matrix.columns)
+
+def daily_averages(matrix, forecaster=None):
+    forecaster = forecaster or get_forecaster()
+    return value_at_last_dispatch(matrix, forecaster.daily_average(matrix))
+
+def forecast_products(products, forecaster=None):
+    """Forecast every product in the queryset in one pass. Returns a list of dicts in FORECAST_FIELDS order."""
+    catalog = pd.DataFrame(
+        list(products.values_list('id', 'sku', 'name', 'quantity')),
+        columns=['id', 'sku', 'product', 'stock']
+    ).set_index('id')
+
+    matrix = daily_usage_matrix(products)
+    if matrix.empty:
+        catalog['daily_average'] = 0.0
+    else:
+        catalog['daily_average'] = daily_averages(matrix, forecaster).reindex(catalog.index).fillna(0)
+
+    averages = catalog['daily_average'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        days_left = np.floor(catalog['stock'].to_numpy() / averages)
+    catalog['forecast_days_left'] = pd.Series(days_left, index=catalog.index).where(averages > 0)
+    catalog['daily_average'] = catalog['daily_average'].round(2)
+
+    return [
+        {
+            'sku': row.sku,
+            'product': row.product,
+            'stock': int(row.stock),
+            'daily_average': float(row.daily_average),
+            'forecast_days_left': None if pd.isna(row.forecast_days_left) else int(row.forecast_days_left),
+        }
+        for row in catalog.itertuples()
+    ]
+
+
+# -----------------------
+# Per-product forecast state
+# -----------------------
+
+def refresh_average(state):
+    if state.window_end is None:
+        state.daily_average = 0
+    else:
+        days = min(ROLLING_WINDOW, (state.window_end - state.first_dispatch).days + 1)
+        state.daily_average = sum(state.window) / days
+    state.computed_at = timezone.now()
+
+def compute_state(product):
+    """Full recompute from the outbound rollup: the first dispatch day plus the last ROLLING_WINDOW days."""
+    usage = DailyVolume.objects.filter(product=product, direction='outbound').exclude(quantity=0)
+    state = ForecastState(product=product, window=[0] * ROLLING_WINDOW)
+    recent = list(usage.order_by('-date').values_list('date', 'quantity')[:ROLLING_WINDOW])
+    if recent:
+        state.window_end = recent[0][0]
+        state.first_dispatch = usage.aggregate(first=Min('date'))['first']
+        for day, qty in recent:
+            offset = (state.window_end - day).days
+            if offset < ROLLING_WINDOW:
+                state.window[ROLLING_WINDOW - 1 - offset] += qty
+    refresh_average(state)
+    return state
+
+def get_forecast_state(product, refresh=False):
+    state = getattr(product, 'forecast_state', None) if not refresh else None
+    if state is not None and len(state.window) == ROLLING_WINDOW:
+        return state
+
+    # The row is committed (empty if new) before the recompute, and the
+    # recompute holds its lock: a concurrent apply_usage_deltas() either
+    # committed first, so the rollup read below includes it, or waits and
+    # applies its increment on top of the rebuilt window. Neither is lost.
+    ForecastState.objects.get_or_create(product=product)
+    with transaction.atomic():
+        locked = ForecastState.objects.select_for_update().filter(product=product).first()
+        fresh = compute_state(product)
+        if locked is None:
+            # Dropped by an outbound removal meanwhile; the next read rebuilds it.
+            return fresh
+        fresh.pk = locked.pk
+        fresh.save(force_update=True)
+    return fresh
+
+def add_usage(state, day, qty):
+    if state.window_end is None:
+        state.window = [0] * ROLLING_WINDOW
+        state.window_end = state.first_dispatch = day
+    shift = (day - state.window_end).days
+    if shift > 0:
+        state.window = (state.window + [0] * min(shift, ROLLING_WINDOW))[-ROLLING_WINDOW:]
+        state.window_end = day
+        shift = 0
+    index = ROLLING_WINDOW - 1 + shift
+    if index >= 0:
+        state.window[index] += qty
+    state.first_dispatch = min(state.first_dispatch, day)
+
+def apply_usage_deltas(deltas):
+    """
+    Fold {(product_id, date): delta} outbound changes into existing forecast
+    states. Additions shift the window in place; removals can move the last
+    or first dispatch day, so those states are dropped and rebuilt on next read.
+    Products without a state are left alone for the same reason.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        product_ids = {product_id for product_id, _ in deltas}
+        stale = {product_id for (product_id, _), delta in deltas.items() if delta < 0}
+        ForecastState.objects.filter(product_id__in=stale).delete()
+
+        states = ForecastState.objects.select_for_update().filter(product_id__in=product_ids - stale).order_by('pk')
+        states = {state.product_id: state for state in states}
+        for (product_id, day), delta in sorted(deltas.items(), key=lambda item: item[0][1]):
+            state = states.get(product_id)
+            if state is not None:
+                add_usage(state, day, delta)
+        for state in states.values():
+            refresh_average(state)
+        ForecastState.objects.bulk_update(
+            states.values(), ['window', 'window_end', 'first_dispatch', 'daily_average', 'computed_at']
+        )
+
+
+# -----------------------
+# Streaming output
+# -----------------------
+
+def stream_json(results):
+    yield '['
+    for i, result in enumerate(results):
+        yield (',' if i else '') + json.dumps(result, cls=DjangoJSONEncoder)
+    yield ']'
+
+def stream_csv(results):
+    buffer = StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FORECAST_FIELDS)
+    writer.writeheader()
+    for result in results:
+        writer.writerow(result)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
@@ -0,0 +1,428 @@
+import codecs
+import csv
+import time
+from contextlib import nullcontext
+from collections import defaultdict
+from datetime import datetime
+from functools import partial
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Product, InboundTransaction, OutboundTransaction, CycleCount
+from .utils import log_audit_bulk
+from .dashboard import invalidate_summary
+from .rollups import apply_volume_deltas, volume_deltas
+from .tags import sync_product_tags
+from .stock import UPDATE_CHUNK_SIZE, increment_stock, record_movements
+
+CSV_DATE_FORMAT = "%m/%d/%Y"
+LOOKUP_CHUNK_SIZE = 900
+MAX_REPORTED_REJECTIONS = 1000
+
+# Product fields a catalog upsert may overwrite. Stock is left alone unless
+# `quantity` is asked for explicitly.
+UPSERT_FIELDS = ['name', 'tags', 'description', 'category', 'quantity', 'low_stock_threshold']
+UPSERT_DEFAULT_FIELDS = ['name', 'tags', 'description', 'category', 'low_stock_threshold']
+PRODUCT_DEFAULTS = {'tags': '', 'description': '', 'category': '', 'quantity': 0, 'low_stock_threshold': 10}
+
+
+def get_batch_size():
+    return getattr(settings, 'INGEST_BATCH_SIZE', 2000)
+
+
+class RowError(Exception):
+    pass
+
+
+def parse_quantity(value, minimum=1):
+    try:
+        qty = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"Invalid quantity '{value}'")
+    if qty < minimum:
+        raise RowError(f"Quantity must be at least {minimum}, got {qty}")
+    return qty
+
+def parse_date(value):
+    try:
+        return datetime.strptime((value or '').strip(), CSV_DATE_FORMAT).date()
+    except ValueError:
+        raise RowError(f"Invalid date '{value}', expected MM/DD/YYYY")
+
+def parse_sku(row):
+    # JSON bodies may carry numeric SKUs.
+    sku = str(row.get('sku') or '').strip()
+    if not sku:
+        raise RowError("Missing sku")
+    return sku
+
+def lock_products(skus):
+    """Lock the products for `skus` with SELECT ... FOR UPDATE (in pk order) and return them keyed by SKU."""
+    skus = sorted(skus)
+    products = {}
+    for i in range(0, len(skus), LOOKUP_CHUNK_SIZE):
+        qs = Product.objects.select_for_update().filter(sku__in=skus[i:i + LOOKUP_CHUNK_SIZE]).order_by('pk')
+        products.update((p.sku, p) for p in qs)
+    return products
+
+def fetch_quantities(pks):
+    pks = list(pks)
+    quantities = {}
+    for i in range(0, len(pks), LOOKUP_CHUNK_SIZE):
+        quantities.update(Product.objects.filter(pk__in=pks[i:i + LOOKUP_CHUNK_SIZE]).values_list('pk', 'quantity'))
+    return quantities
+
+
+# -----------------------
+# Streaming pipeline
+# -----------------------
+
+def read_csv(uploaded_file):
+    # UploadedFile iterates line by line over its chunks, and iterdecode keeps
+    # multi-byte characters split across chunk boundaries intact, so only the
+    # current line is ever held in memory.
+    return csv.DictReader(codecs.iterdecode(uploaded_file, 'utf-8-sig'))
+
+def batched(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+class IngestReport:
+    # A resumed job starts from the totals it had already committed. Rows are
+    # identified by CSV `line`, or for a JSON list by its 0-based `index`.
+    def __init__(self, accepted=0, rejected_count=0, rejected=None, summary=None, position='line'):
+        self.position = position
+        self.started = time.perf_counter()
+        self.accepted = accepted
+        self.rejected_count = rejected_count
+        self.rejected = list(rejected or [])
+        self.summary = defaultdict(int, summary or {})
+        self.last_line = 0
+
+    def count(self, key, n=1):
+        self.summary[key] += n
+
+    def reject(self, line, sku, error):
+        self.rejected_count += 1
+        if len(self.rejected) < MAX_REPORTED_REJECTIONS:
+            self.rejected.append({self.position: line, 'sku': sku, 'error': str(error)})
+
+    def clean(self, rows, clean_row, resume_after=0):
+        # Line numbers count the CSV header as line 1; a csv reader's own
+        # line_num is preferred so quoted multi-line fields are accounted for.
+        # Lines up to `resume_after` were committed by an earlier run.
+        for index, row in enumerate(rows):
+            line = getattr(rows, 'line_num', index + 2) if self.position == 'line' else index
+            if resume_after and line <= resume_after:
+                continue
+            if not isinstance(row, dict):
+                self.reject(line, None, "Expected an object")
+                continue
+            try:
+                sku, fields = clean_row(row)
+            except RowError as e:
+                self.reject(line, row.get('sku'), e)
+                continue
+            yield line, sku, fields
+
+    def as_dict(self):
+        return {
+            'accepted': self.accepted,
+            'rejected_count': self.rejected_count,
+            'rejected': sorted(self.rejected, key=lambda r: r[self.position]),
+            'summary': dict(self.summary),
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1),
+        }
+
+
+def run_ingest(rows, clean_row, process_batch, user=None, batch_size=None, atomic=True, on_batch=None,
+               report=None, resume_after=0):
+    # Rows are validated lazily and handed to the database layer in fixed-size
+    # batches. By default the whole file is one transaction; with atomic=False
+    # each batch commits on its own. on_batch(report) runs inside the batch's
+    # transaction, so progress it saves (report.last_line included) commits
+    # together with the rows it describes.
+    report = report or IngestReport()
+    with transaction.atomic() if atomic else nullcontext():
+        for batch in batched(report.clean(rows, clean_row, resume_after), batch_size or get_batch_size()):
+            with transaction.atomic(savepoint=False):
+                process_batch(batch, report, user)
+                report.last_line = batch[-1][0]
+                if on_batch:
+                    on_batch(report)
+    return report.as_dict()
+
+
+# -----------------------
+# Products
+# -----------------------
+
+def clean_product_row(row):
+    # Only columns present in the row are returned; creating a product fills
+    # the rest from PRODUCT_DEFAULTS, updating one leaves them as they are.
+    sku = parse_sku(row)
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise RowError("Missing name")
+    fields = {'name': name, 'is_archived': False}
+    for key in ('tags', 'description', 'category'):
+        if row.get(key) is not None:
+            fields[key] = row[key]
+    if row.get('quantity') is not None:
+        fields['quantity'] = parse_quantity(row['quantity'], minimum=0)
+    if row.get('low_stock_threshold') not in (None, ''):
+        fields['low_stock_threshold'] = parse_quantity(row['low_stock_threshold'], minimum=0)
+    return sku, fields
+
+def dedupe_by_sku(batch, report):
+    # Postgres refuses to upsert the same key twice in one statement, so the
+    # last occurrence of a SKU within a batch wins.
+    rows = {}
+    for line, sku, fields in batch:
+        if sku in rows:
+            report.reject(rows[sku][0], sku, f"Duplicate SKU, superseded by {report.position} {line}")
+        rows[sku] = (line, fields)
+    return rows
+
+def fetch_existing(skus, fields=()):
+    skus = list(skus)
+    existing = {}
+    for i in range(0, len(skus), LOOKUP_CHUNK_SIZE):
+        qs = Product.objects.filter(sku__in=skus[i:i + LOOKUP_CHUNK_SIZE]).values('sku', *fields)
+        existing.update((p['sku'], p) for p in qs)
+    return existing
+
+def create_products(batch, report, user=None):
+    rows = dedupe_by_sku(batch, report)
+    existing = fetch_existing(rows)
+
+    products = []
+    for sku, (line, fields) in rows.items():
+        if sku in existing:
+            report.reject(line, sku, f"SKU '{sku}' already exists")
+            continue
+        products.append(Product(sku=sku, **{**PRODUCT_DEFAULTS, **fields}))
+
+    Product.objects.bulk_create(products)
+    sync_product_tags({product.pk: product.tags for product in products})
+    record_movements({product.pk: product.quantity for product in products}, 'initial')
+    invalidate_summary()
+    report.count('created', len(products))
+    report.accepted += len(products)
+
+def upsert_products(batch, report, user=None, update_fields=UPSERT_DEFAULT_FIELDS):
+    # Existing rows are compared first so unchanged products are skipped
+    # entirely and the summary can tell created from updated.
+    rows = dedupe_by_sku(batch, report)
+    existing = fetch_existing(rows, update_fields)
+
+    products = []
+    for sku, (line, fields) in rows.items():
+        current = existing.get(sku)
+        values = {**PRODUCT_DEFAULTS, **(current or {}), **fields, 'sku': sku}
+        if current is None:
+            report.count('created')
+        elif any(current[f] != values[f] for f in update_fields):
+            report.count('updated')
+        else:
+            report.count('unchanged')
+            continue
+        products.append(Product(**values))
+
+    Product.objects.bulk_create(
+        products,
+        update_conflicts=True,
+        unique_fields=['sku'],
+        update_fields=[*update_fields, 'updated_at']
+    )
+    # Conflicting rows don't reliably get their pk back, so resolve by SKU.
+    tagged = {p.sku: p.tags for p in products if 'tags' in update_fields or p.sku not in existing}
+    created = {p.sku: p.quantity for p in products if p.sku not in existing}
+    edited = {}
+    if 'quantity' in update_fields:
+        # Ledger deltas for overwritten stock, relative to the quantities read above.
+        edited = {p.sku: p.quantity - existing[p.sku]['quantity'] for p in products if p.sku in existing}
+    if tagged or created or edited:
+        ids = fetch_existing({*tagged, *created, *edited}, ['id'])
+        sync_product_tags({ids[sku]['id']: tags for sku, tags in tagged.items()})
+        record_movements({ids[sku]['id']: qty for sku, qty in created.items()}, 'initial')
+        record_movements({ids[sku]['id']: delta for sku, delta in edited.items()}, 'edit')
+    invalidate_summary()
+    report.accepted += len(rows)
+
+def ingest_products(rows, user=None, mode='create', update_fields=None, **options):
+    if mode == 'upsert':
+        # Only columns present in the file can be updated; a missing column
+        # leaves existing products' values alone rather than blanking them.
+        columns = getattr(rows, 'fieldnames', None) or UPSERT_FIELDS
+        update_fields = [f for f in update_fields or UPSERT_DEFAULT_FIELDS if f in columns]
+        process_batch = partial(upsert_products, update_fields=update_fields)
+    else:
+        process_batch = create_products
+    return run_ingest(rows, clean_product_row, process_batch, user, **options)
+
+
+# -----------------------
+# Inbound
+# -----------------------
+
+def clean_inbound_row(row):
+    return parse_sku(row), {
+        'supplier': row.get('supplier') or '',
+        'quantity': parse_quantity(row.get('quantity')),
+        'invoice_reference': row.get('invoice_reference') or '',
+        'received_date': parse_date(row.get('received_date')),
+    }
+
+def receive_inbounds(batch, report, user=None):
+    # One SKU lookup, bulk inserts for transactions and audit rows, and one
+    # aggregated stock increment per product.
+    products = Product.objects.in_bulk({sku for _, sku, _ in batch}, field_name='sku')
+
+    inbounds = []
+    deltas = defaultdict(int)
+    for line, sku, fields in batch:
+        product = products.get(sku)
+        if product is None:
+            report.reject(line, sku, f"Unknown SKU '{sku}'")
+            continue
+        inbounds.append(InboundTransaction(product=product, **fields))
+        deltas[product.pk] += fields['quantity']
+
+    InboundTransaction.objects.bulk_create(inbounds)
+    increment_stock(deltas)
+    apply_volume_deltas(volume_deltas('inbound', inbounds))
+
+    # The incremented rows stay locked until commit, so re-reading them gives
+    # exact before/after quantities for each row's audit entry.
+    running = {pk: qty - deltas[pk] for pk, qty in fetch_quantities(deltas).items()}
+    entries = []
+    for inbound in inbounds:
+        before = running[inbound.product_id]
+        running[inbound.product_id] += inbound.quantity
+        entries.append((inbound.product, {'quantity': [before, before + inbound.quantity]}, inbound))
+    log_audit_bulk(entries, 'update', user)
+    report.accepted += len(inbounds)
+
+def ingest_inbounds(rows, user=None, **options):
+    return run_ingest(rows, clean_inbound_row, receive_inbounds, user, **options)
+
+
+# -----------------------
+# Outbound
+# -----------------------
+
+def clean_outbound_row(row):
+    customer = (row.get('customer') or '').strip()
+    if not customer:
+        raise RowError("Missing customer")
+    return parse_sku(row), {
+        'customer': customer,
+        'quantity': parse_quantity(row.get('quantity')),
+        'so_reference': row.get('so_reference') or '',
+        'dispatch_date': parse_date(row.get('dispatch_date')),
+    }
+
+def dispatch_outbounds(batch, report, user=None):
+    # Stock is allocated in file order against the locked quantities, so an
+    # earlier row can starve a later one for the same SKU; starved rows are
+    # rejected rather than overselling. Locks are held until the surrounding
+    # transaction commits, so later batches see the quantities written here.
+    products = lock_products({sku for _, sku, _ in batch})
+
+    outbounds = []
+    changes = []
+    touched = {}
+    dispatched = defaultdict(int)
+    for line, sku, fields in batch:
+        product = products.get(sku)
+        if product is None:
+            report.reject(line, sku, f"Unknown SKU '{sku}'")
+            continue
+        if fields['quantity'] > product.quantity:
+            report.reject(line, sku, f"Cannot dispatch {fields['quantity']} items. Only {product.quantity} in stock.")
+            continue
+        changes.append({'quantity': [product.quantity, product.quantity - fields['quantity']]})
+        product.quantity -= fields['quantity']
+        touched[product.pk] = product
+        dispatched[product.pk] -= fields['quantity']
+        outbounds.append(OutboundTransaction(product=product, **fields))
+
+    now = timezone.now()
+    for product in touched.values():
+        product.updated_at = now
+
+    OutboundTransaction.objects.bulk_create(outbounds)
+    apply_volume_deltas(volume_deltas('outbound', outbounds))
+    Product.objects.bulk_update(touched.values(), ['quantity', 'updated_at'], batch_size=UPDATE_CHUNK_SIZE)
+    record_movements(dispatched, 'outbound')
+    log_audit_bulk(
+        [(outbound.product, change, outbound) for outbound, change in zip(outbounds, changes)], 'update', user
+    )
+    report.accepted += len(outbounds)
+
+def ingest_outbounds(rows, user=None, **options):
+    return run_ingest(rows, clean_outbound_row, dispatch_outbounds, user, **options)
+
+
+# -----------------------
+# Cycle counts
+# -----------------------
+
+def clean_count_row(row):
+    return parse_sku(row), {
+        'counted_quantity': parse_quantity(row.get('counted_quantity'), minimum=0),
+        'reason': row.get('reason') or '',
+    }
+
+def apply_counts(batch, report, user=None):
+    # System quantities are read under row locks, so nothing can move stock
+    # between reading them and overwriting them with the counts. A SKU counted
+    # twice keeps its last count.
+    rows = dedupe_by_sku(batch, report)
+    products = lock_products(rows)
+    counted_by = user.username if user and user.is_authenticated else 'admin'
+
+    counts = []
+    touched = []
+    deltas = {}
+    now = timezone.now()
+    for sku, (line, fields) in rows.items():
+        product = products.get(sku)
+        if product is None:
+            report.reject(line, sku, f"Unknown SKU '{sku}'")
+            continue
+        system = product.quantity
+        discrepancy = fields['counted_quantity'] - system
+        counts.append(CycleCount(
+            product=product, system_quantity=system, discrepancy=discrepancy, counted_by=counted_by, **fields
+        ))
+        if discrepancy:
+            report.count('over' if discrepancy > 0 else 'short')
+            report.count('units_over' if discrepancy > 0 else 'units_short', abs(discrepancy))
+            product.quantity = fields['counted_quantity']
+            product.updated_at = now
+            touched.append(product)
+            deltas[product.pk] = discrepancy
+        else:
+            report.count('matched')
+
+    CycleCount.objects.bulk_create(counts, batch_size=UPDATE_CHUNK_SIZE)
+    Product.objects.bulk_update(touched, ['quantity', 'updated_at'], batch_size=UPDATE_CHUNK_SIZE)
+    record_movements(deltas, 'count')
+    log_audit_bulk(
+        [(c.product, {'quantity': [c.system_quantity, c.counted_quantity]}, c) for c in counts if c.discrepancy],
+        'update', user
+    )
+    if touched:
+        invalidate_summary()
+    report.count('net_discrepancy', sum(deltas.values()))
+    report.accepted += len(counts)
+
+def ingest_counts(rows, user=None, **options):
+    return run_ingest(rows, clean_count_row, apply_counts, user, **options)
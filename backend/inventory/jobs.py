@@ -0,0 +1,117 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .ingest import IngestReport, read_csv, ingest_products, ingest_inbounds, ingest_outbounds
+from .models import UploadJob
+
+logger = logging.getLogger(__name__)
+
+INGESTERS = {
+    'products': ingest_products,
+    'inbounds': ingest_inbounds,
+    'outbounds': ingest_outbounds,
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'UPLOAD_JOB_WORKERS', 2),
+                thread_name_prefix='upload-job'
+            )
+        return _executor
+
+
+def enqueue_job(job):
+    # Submit only once the job row is committed, so the worker can see it.
+    transaction.on_commit(lambda: get_executor().submit(run_job_in_thread, job.pk))
+
+
+def run_job_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        # Worker threads get their own connections; don't leak them.
+        connections.close_all()
+
+
+class JobLost(Exception):
+    """The job was requeued and claimed by another worker while this one ran it."""
+
+
+def run_job(job_id):
+    # Claim the job atomically so a job is never picked up twice. started_at
+    # doubles as the claim's lease: every later write requires it unchanged.
+    started = timezone.now()
+    claimed = UploadJob.objects.filter(pk=job_id, status='queued').update(
+        status='running', started_at=started, heartbeat_at=started
+    )
+    if not claimed:
+        return
+    job = UploadJob.objects.select_related('submitted_by').get(pk=job_id)
+    leased = UploadJob.objects.filter(pk=job.pk, status='running', started_at=started)
+
+    def save_progress(report):
+        # Runs in the batch's transaction, so resume_line never gets ahead of
+        # (or behind) the rows actually committed. A worker that lost its
+        # lease rolls the batch back instead of applying it a second time.
+        saved = leased.update(
+            rows_processed=report.accepted + report.rejected_count,
+            rows_accepted=report.accepted,
+            rows_rejected=report.rejected_count,
+            rejected=report.rejected,
+            summary=dict(report.summary),
+            resume_line=report.last_line,
+            heartbeat_at=timezone.now(),
+        )
+        if not saved:
+            raise JobLost(job.pk)
+
+    # A requeued job picks up after the last batch that committed.
+    report = IngestReport(job.rows_accepted, job.rows_rejected, job.rejected, job.summary)
+
+    try:
+        with job.file.open('rb') as file:
+            # Each batch commits on its own so progress is visible to pollers.
+            report = INGESTERS[job.kind](
+                read_csv(file), job.submitted_by, atomic=False, on_batch=save_progress,
+                report=report, resume_after=job.resume_line, **job.options
+            )
+    except JobLost:
+        logger.warning("Upload job %s was requeued while running; leaving it to its new worker", job.pk)
+        return
+    except Exception as e:
+        logger.exception("Upload job %s failed", job.pk)
+        leased.update(status='failed', error=str(e), finished_at=timezone.now())
+        return
+
+    leased.update(
+        status='completed',
+        rows_processed=report['accepted'] + report['rejected_count'],
+        rows_accepted=report['accepted'],
+        rows_rejected=report['rejected_count'],
+        rejected=report['rejected'],
+        summary=report['summary'],
+        finished_at=timezone.now(),
+    )
+
+
+def requeue_stale_jobs(stale_after=None):
+    """Requeue running jobs with no heartbeat for `stale_after` seconds; returns how many."""
+    stale_after = stale_after or getattr(settings, 'UPLOAD_JOB_STALE_SECONDS', 600)
+    cutoff = timezone.now() - timedelta(seconds=stale_after)
+    # Progress is left alone: the job skips the lines it already committed.
+    return UploadJob.objects.filter(status='running', heartbeat_at__lt=cutoff).update(
+        status='queued', started_at=None, heartbeat_at=None
+    )
@@ -0,0 +1,174 @@
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from io import BytesIO
+
+import barcode
+import qrcode
+from barcode.writer import ImageWriter
+from django.conf import settings
+from PIL import Image, ImageDraw
+
+# Rendered labels are cached by content: the key hashes the label kind, the
+# SKU and RENDER_VERSION, so a given key always maps to the same PNG. Images
+# live on disk under MEDIA_ROOT/label_cache and the hottest ones also in an
+# in-process LRU; the key doubles as the HTTP ETag. Bump RENDER_VERSION when
+# the rendering changes. Callers only cache labels for SKUs that exist (see
+# label_response), so requests for made-up SKUs can't fill the disk.
+#
+# Rendering functions here don't touch the ORM, so they can run in a process
+# pool without Django being set up in the workers. The pool spawns fresh
+# processes rather than forking this one, which runs the audit writer and
+# upload job threads.
+
+RENDER_VERSION = 1
+LABEL_KINDS = ('barcode', 'qrcode')
+LRU_SIZE = 1024
+POOL_THRESHOLD = 16
+
+# Sheet layout: A4 at 150 dpi.
+PAGE_SIZE = (1240, 1754)
+PAGE_MARGIN = 40
+CAPTION_HEIGHT = 24
+
+
+def render_label(kind, sku):
+    buffer = BytesIO()
+    if kind == 'barcode':
+        barcode.get_barcode_class('code128')(sku, writer=ImageWriter()).write(buffer)
+    else:
+        qrcode.make(sku).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+def label_key(kind, sku):
+    return hashlib.sha256(f'{kind}:{RENDER_VERSION}:{sku}'.encode()).hexdigest()
+
+def label_etag(kind, sku):
+    return f'"{label_key(kind, sku)}"'
+
+def cache_path(key):
+    return os.path.join(settings.MEDIA_ROOT, 'label_cache', key[:2], f'{key}.png')
+
+def read_cached(key):
+    try:
+        with open(cache_path(key), 'rb') as file:
+            return file.read()
+    except FileNotFoundError:
+        return None
+
+def is_cached(kind, sku):
+    return os.path.exists(cache_path(label_key(kind, sku)))
+
+def write_cached(key, png):
+    # Write then rename, so concurrent readers never see a partial file.
+    path = cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        file.write(png)
+    os.replace(tmp, path)
+
+@lru_cache(maxsize=LRU_SIZE)
+def get_label(kind, sku):
+    """PNG bytes for one label: memory, then disk, then a fresh render."""
+    key = label_key(kind, sku)
+    png = read_cached(key)
+    if png is None:
+        png = render_label(kind, sku)
+        write_cached(key, png)
+    return png
+
+
+# -----------------------
+# Label sheets
+# -----------------------
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'LABEL_RENDER_WORKERS', None),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool
+
+def get_labels(kind, skus):
+    """{sku: png} for many SKUs. Cache misses are rendered in the process pool when there are enough of them."""
+    labels = {}
+    missing = []
+    for sku in dict.fromkeys(skus):
+        png = read_cached(label_key(kind, sku))
+        if png is None:
+            missing.append(sku)
+        else:
+            labels[sku] = png
+
+    if len(missing) >= POOL_THRESHOLD:
+        rendered = get_pool().map(render_label, [kind] * len(missing), missing, chunksize=8)
+    else:
+        rendered = (render_label(kind, sku) for sku in missing)
+    for sku, png in zip(missing, rendered):
+        write_cached(label_key(kind, sku), png)
+        labels[sku] = png
+    return labels
+
+def tile(images, captions, columns, cell_width):
+    # Scale every label to the cell width and lay them out in rows.
+    cells = []
+    for image, caption in zip(images, captions):
+        image = image.convert('L')
+        height = round(image.height * cell_width / image.width)
+        cell = Image.new('L', (cell_width, height + (CAPTION_HEIGHT if caption else 0)), 'white')
+        cell.paste(image.resize((cell_width, height)), (0, 0))
+        if caption:
+            ImageDraw.Draw(cell).text((cell_width // 2, height + 4), caption, fill='black', anchor='ma')
+        cells.append(cell)
+    return [cells[i:i + columns] for i in range(0, len(cells), columns)]
+
+def render_sheet(kind, skus, columns=3, output='pdf'):
+    """A printable sheet of labels for `skus`, in order: A4 PDF pages, or one tall tiled PNG."""
+    labels = get_labels(kind, skus)
+    images = [Image.open(BytesIO(labels[sku])) for sku in skus]
+    # Barcodes print their own text; QR codes get the SKU underneath.
+    captions = [sku if kind == 'qrcode' else None for sku in skus]
+    cell_width = (PAGE_SIZE[0] - PAGE_MARGIN * (columns + 1)) // columns
+    rows = tile(images, captions, columns, cell_width)
+
+    pages = []
+    page = None
+    y = PAGE_MARGIN
+    for row in rows:
+        row_height = max(cell.height for cell in row)
+        if page is None or (output == 'pdf' and y + row_height > PAGE_SIZE[1] - PAGE_MARGIN):
+            page = []
+            pages.append(page)
+            y = PAGE_MARGIN
+        page.append((y, row))
+        y += row_height + PAGE_MARGIN
+
+    sheets = []
+    for page in pages:
+        height = PAGE_SIZE[1] if output == 'pdf' else page[-1][0] + max(c.height for c in page[-1][1]) + PAGE_MARGIN
+        sheet = Image.new('L', (PAGE_SIZE[0], height), 'white')
+        for y, row in page:
+            for i, cell in enumerate(row):
+                sheet.paste(cell, (PAGE_MARGIN + i * (cell_width + PAGE_MARGIN), y))
+        sheets.append(sheet)
+
+    buffer = BytesIO()
+    if output == 'pdf':
+        # Labels are black on white; 1-bit pages keep the PDF an order of magnitude smaller.
+        sheets = [sheet.convert('1', dither=Image.Dither.NONE) for sheet in sheets]
+        sheets[0].save(buffer, format='PDF', save_all=True, append_images=sheets[1:], resolution=150)
+    else:
+        sheets[0].save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.archive import archive_audit_logs, get_retention_days
+
+
+class Command(BaseCommand):
+    help = (
+        "Move AuditLog rows older than the retention window into monthly gzip CSV "
+        "archives, in bounded batches. Archived rows stay readable via /api/audit-log/archived/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Keep this many days in the live table (default: AUDIT_RETENTION_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else get_retention_days()
+        archives = archive_audit_logs(timezone.now() - timedelta(days=days), batch_size=options['batch_size'])
+        for archive in archives:
+            self.stdout.write(f"{archive.file.name}: {archive.row_count} rows")
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {sum(a.row_count for a in archives)} audit rows into {len(archives)} files"
+        ))
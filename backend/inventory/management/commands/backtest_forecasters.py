@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.forecasting import FORECASTERS, daily_usage_matrix
+from inventory.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay stored outbound history for every SKU through each forecaster and "
+        "report one-step-ahead error and runtime per model."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--models', default=','.join(FORECASTERS),
+                            help="Comma separated forecasters to evaluate.")
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help="Products per usage matrix, to bound memory.")
+
+    def handle(self, *args, **options):
+        names = [name.strip() for name in options['models'].split(',') if name.strip()]
+        unknown = set(names) - set(FORECASTERS)
+        if unknown:
+            raise CommandError(f"Unknown models: {', '.join(sorted(unknown))}")
+
+        stats = {name: {'abs': 0.0, 'sq': 0.0, 'actual': 0.0, 'n': 0, 'seconds': 0.0} for name in names}
+        product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+        chunk = options['chunk_size']
+        for i in range(0, len(product_ids), chunk):
+            matrix = daily_usage_matrix(Product.objects.filter(pk__in=product_ids[i:i + chunk]))
+            if matrix.empty:
+                continue
+            actual = matrix.to_numpy(dtype=float)[1:]
+            for name in names:
+                started = time.perf_counter()
+                forecast = FORECASTERS[name].one_step(matrix).to_numpy(dtype=float)[:-1]
+                stats[name]['seconds'] += time.perf_counter() - started
+
+                valid = ~np.isnan(actual) & ~np.isnan(forecast)
+                errors = forecast[valid] - actual[valid]
+                stats[name]['abs'] += np.abs(errors).sum()
+                stats[name]['sq'] += np.square(errors).sum()
+                stats[name]['actual'] += actual[valid].sum()
+                stats[name]['n'] += int(valid.sum())
+
+        self.stdout.write(f"{'model':<16}{'points':>12}{'MAE':>10}{'RMSE':>10}{'WAPE':>10}{'runtime ms':>12}")
+        for name, s in stats.items():
+            n = s['n'] or 1
+            wape = s['abs'] / s['actual'] if s['actual'] else float('nan')
+            self.stdout.write(
+                f"{name:<16}{s['n']:>12}{s['abs'] / n:>10.3f}{(s['sq'] / n) ** 0.5:>10.3f}"
+                f"{wape:>10.3f}{s['seconds'] * 1000:>12.1f}"
+            )
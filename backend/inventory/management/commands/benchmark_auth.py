@@ -0,0 +1,53 @@
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from inventory.authentication import StatelessJWTAuthentication
+from inventory.models import User
+from inventory.permissions import IsOperator
+from inventory.serializers import CustomTokenObtainPairSerializer
+
+BACKENDS = [
+    ('simplejwt', JWTAuthentication),
+    ('stateless', StatelessJWTAuthentication),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request authentication overhead: decode the bearer token, "
+        "resolve request.user and run a role permission check, once with "
+        "SIMPLE_JWT's JWTAuthentication and once with StatelessJWTAuthentication."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        user = User.objects.create_user(f'bench-{uuid.uuid4().hex[:8]}', role='operator')
+        try:
+            token = str(CustomTokenObtainPairSerializer.get_token(user).access_token)
+            factory = APIRequestFactory()
+            self.stdout.write(f"{'backend':<12}{'us/request':>12}{'queries':>10}")
+            for name, backend in BACKENDS:
+                def authorize():
+                    request = Request(factory.get('/', HTTP_AUTHORIZATION=f'Bearer {token}'), authenticators=[backend()])
+                    assert IsOperator().has_permission(request, None)
+
+                authorize()
+                with CaptureQueriesContext(connection) as queries:
+                    authorize()
+
+                started = time.perf_counter()
+                for _ in range(options['requests']):
+                    authorize()
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"{name:<12}{elapsed / options['requests'] * 1e6:>12.1f}{len(queries):>10}")
+        finally:
+            user.delete()
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from inventory.jobs import requeue_stale_jobs, run_job
+from inventory.models import UploadJob
+
+
+class Command(BaseCommand):
+    help = "Run queued bulk upload jobs in this process (e.g. ones left behind by a restarted web worker)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requeue-running', action='store_true',
+                            help="Also resume 'running' jobs whose worker died, after their last committed batch.")
+        parser.add_argument('--stale-after', type=int, default=None,
+                            help="Seconds without a heartbeat before a running job counts as dead "
+                                 "(default: UPLOAD_JOB_STALE_SECONDS).")
+
+    def handle(self, *args, **options):
+        if options['requeue_running']:
+            requeued = requeue_stale_jobs(options['stale_after'])
+            self.stdout.write(f"Requeued {requeued} stale job(s)")
+
+        job_ids = list(UploadJob.objects.filter(status='queued').order_by('created_at').values_list('pk', flat=True))
+        for job_id in job_ids:
+            run_job(job_id)
+            job = UploadJob.objects.get(pk=job_id)
+            self.stdout.write(f"{job}: {job.rows_accepted} accepted, {job.rows_rejected} rejected")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventory.rollups import rebuild_daily_volume
+
+
+class Command(BaseCommand):
+    help = "Rebuild the DailyVolume rollup from the inbound and outbound transaction tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        created = rebuild_daily_volume(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt DailyVolume: {created} rows"))
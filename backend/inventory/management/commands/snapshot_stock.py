@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from inventory.stock import take_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        "Write a StockSnapshot for every product whose stock moved since its last "
+        "snapshot. Run it periodically (e.g. nightly from cron) to keep stock-at replays short."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--at', help="ISO timestamp to snapshot at (default: a few minutes ago).")
+
+    def handle(self, *args, **options):
+        cutoff = None
+        if options['at']:
+            cutoff = parse_datetime(options['at'])
+            if cutoff is None:
+                raise CommandError("--at must be an ISO 8601 timestamp")
+        created = take_snapshots(cutoff)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {created} stock snapshots"))
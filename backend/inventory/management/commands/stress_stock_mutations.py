@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import DatabaseError, connection
+
+from inventory.models import Product
+from inventory.stock import InsufficientStock, adjust_stock
+
+
+def atomic_adjust(product, delta):
+    adjust_stock(product, delta, 'edit')
+
+def legacy_adjust(product, delta):
+    # The read-modify-write pattern the views used before inventory.stock.
+    product = Product.objects.get(pk=product.pk)
+    if product.quantity + delta < 0:
+        raise InsufficientStock(product, -delta, product.quantity)
+    product.quantity += delta
+    product.save()
+
+
+class Command(BaseCommand):
+    help = (
+        "Hammer a few products with concurrent stock adjustments from many threads "
+        "and check that the final quantities match every change that was applied. "
+        "Run it against PostgreSQL; SQLite serializes writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--operations', type=int, default=500, help="Adjustments per thread.")
+        parser.add_argument('--products', type=int, default=4, help="Fewer products means more contention.")
+        parser.add_argument('--initial', type=int, default=1000, help="Starting stock per product.")
+        parser.add_argument('--compare-legacy', action='store_true',
+                            help="Also run the old read-modify-write save() for comparison.")
+
+    def handle(self, *args, **options):
+        modes = [('atomic', atomic_adjust)]
+        if options['compare_legacy']:
+            modes.append(('legacy', legacy_adjust))
+
+        self.stdout.write(f"{'mode':<10}{'ops/s':>10}{'applied':>10}{'rejected':>10}{'errors':>8}{'lost':>8}")
+        for name, adjust in modes:
+            result = self.run_mode(adjust, options)
+            self.stdout.write(
+                f"{name:<10}{result['ops_per_second']:>10.0f}{result['applied']:>10}"
+                f"{result['rejected']:>10}{result['errors']:>8}{result['lost']:>8}"
+            )
+
+    def run_mode(self, adjust, options):
+        prefix = f'STRESS-{uuid.uuid4().hex[:8]}'
+        Product.objects.bulk_create([
+            Product(name=f'{prefix}-{i}', sku=f'{prefix}-{i}', category='stress', quantity=options['initial'])
+            for i in range(options['products'])
+        ])
+        products = list(Product.objects.filter(sku__startswith=prefix))
+
+        applied = defaultdict(int)
+        counts = defaultdict(int)
+        lock = threading.Lock()
+        start = threading.Barrier(options['threads'])
+
+        def worker(seed):
+            rng = random.Random(seed)
+            local_applied = defaultdict(int)
+            local_counts = defaultdict(int)
+            try:
+                start.wait()
+                for _ in range(options['operations']):
+                    product = rng.choice(products)
+                    delta = rng.choice([-5, -3, -1, 1, 2, 4])
+                    try:
+                        adjust(product, delta)
+                    except InsufficientStock:
+                        local_counts['rejected'] += 1
+                    except DatabaseError:
+                        local_counts['errors'] += 1
+                    else:
+                        local_applied[product.pk] += delta
+                        local_counts['applied'] += 1
+            finally:
+                connection.close()
+            with lock:
+                for pk, delta in local_applied.items():
+                    applied[pk] += delta
+                for key, n in local_counts.items():
+                    counts[key] += n
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(worker, range(options['threads'])))
+        elapsed = time.perf_counter() - started
+
+        final = dict(Product.objects.filter(pk__in=[p.pk for p in products]).values_list('pk', 'quantity'))
+        lost = sum(abs(final[p.pk] - (options['initial'] + applied[p.pk])) for p in products)
+        Product.objects.filter(pk__in=final).delete()
+
+        total = options['threads'] * options['operations']
+        return {
+            'ops_per_second': total / elapsed if elapsed else 0,
+            'applied': counts['applied'],
+            'rejected': counts['rejected'],
+            'errors': counts['errors'],
+            'lost': lost,
+        }
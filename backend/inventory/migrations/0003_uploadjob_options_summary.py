@@ -0,0 +1,23 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_uploadjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='options',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='uploadjob',
+            name='summary',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
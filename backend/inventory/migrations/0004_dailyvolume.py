@@ -0,0 +1,46 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def populate_daily_volume(apps, schema_editor):
+    DailyVolume = apps.get_model('inventory', 'DailyVolume')
+    sources = {
+        'inbound': (apps.get_model('inventory', 'InboundTransaction'), 'received_date'),
+        'outbound': (apps.get_model('inventory', 'OutboundTransaction'), 'dispatch_date'),
+    }
+    for direction, (model, date_field) in sources.items():
+        totals = model.objects.values('product_id', date_field).annotate(total=Sum('quantity')).order_by()
+        DailyVolume.objects.bulk_create(
+            [
+                DailyVolume(direction=direction, product_id=row['product_id'], date=row[date_field], quantity=row['total'])
+                for row in totals.iterator(chunk_size=5000)
+            ],
+            batch_size=5000
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_uploadjob_options_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyVolume',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('direction', models.CharField(choices=[('inbound', 'Inbound'), ('outbound', 'Outbound')], max_length=10)),
+                ('quantity', models.IntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('direction', 'date', 'product'), name='unique_daily_volume')],
+            },
+        ),
+        migrations.RunPython(populate_daily_volume, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_dailyvolume'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ForecastState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.JSONField(default=list)),
+                ('window_end', models.DateField(blank=True, null=True)),
+                ('first_dispatch', models.DateField(blank=True, null=True)),
+                ('daily_average', models.FloatField(default=0)),
+                ('computed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='forecast_state', to='inventory.product')),
+            ],
+        ),
+    ]
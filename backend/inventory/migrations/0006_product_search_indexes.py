@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:10
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+
+TRIGRAM_FIELDS = ['name', 'sku', 'category', 'tags']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Expression indexes on UPPER(col) match the SQL Django emits for
+    # icontains on PostgreSQL, so SearchFilter's ILIKE '%term%' can use them.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in TRIGRAM_FIELDS:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS product_{field}_trgm_idx '
+            f'ON inventory_product USING gin (UPPER("{field}") gin_trgm_ops)'
+        )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for field in TRIGRAM_FIELDS:
+        schema_editor.execute(f'DROP INDEX IF EXISTS product_{field}_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_forecaststate'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_archived', '-created_at', '-id'], name='product_archived_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('low_stock_threshold'))), fields=['-created_at', '-id'], name='product_low_stock_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['name', 'id'], name='product_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['quantity', 'id'], name='product_quantity_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+def parse_existing_tags(apps, schema_editor):
+    Product = apps.get_model('inventory', 'Product')
+    Tag = apps.get_model('inventory', 'Tag')
+    ProductTag = Product.tag_set.through
+
+    parsed = {}
+    for product_id, tags in Product.objects.exclude(tags='').values_list('id', 'tags').iterator(chunk_size=5000):
+        names = []
+        for tag in tags.split(','):
+            tag = tag.strip().lower()[:100]
+            if tag and tag not in names:
+                names.append(tag)
+        parsed[product_id] = names
+
+    Tag.objects.bulk_create(
+        [Tag(name=name) for name in {name for names in parsed.values() for name in names}],
+        batch_size=5000
+    )
+    tag_ids = dict(Tag.objects.values_list('name', 'id'))
+    ProductTag.objects.bulk_create(
+        [ProductTag(product_id=product_id, tag_id=tag_ids[name]) for product_id, names in parsed.items() for name in names],
+        batch_size=5000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_product_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, related_name='products', to='inventory.tag'),
+        ),
+        migrations.RunPython(parse_existing_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_ledger(apps, schema_editor):
+    # Rebuild history from the transaction and cycle-count tables. Whatever
+    # they don't explain (manual edits, initial stock) becomes an opening
+    # balance at the product's creation time, so replay ends at today's quantity.
+    Product = apps.get_model('inventory', 'Product')
+    StockMovement = apps.get_model('inventory', 'StockMovement')
+    sources = [
+        (apps.get_model('inventory', 'InboundTransaction').objects.values_list('product_id', 'created_at', 'quantity'), 'inbound', 1),
+        (apps.get_model('inventory', 'OutboundTransaction').objects.values_list('product_id', 'created_at', 'quantity'), 'outbound', -1),
+        (apps.get_model('inventory', 'CycleCount').objects.exclude(discrepancy=0).values_list('product_id', 'counted_at', 'discrepancy'), 'count', 1),
+    ]
+    explained = {}
+    batch = []
+    for rows, reason, sign in sources:
+        for product_id, created_at, quantity in rows.iterator(chunk_size=5000):
+            batch.append(StockMovement(product_id=product_id, delta=sign * quantity, reason=reason, created_at=created_at))
+            explained[product_id] = explained.get(product_id, 0) + sign * quantity
+            if len(batch) >= 5000:
+                StockMovement.objects.bulk_create(batch)
+                batch = []
+    for product_id, created_at, quantity in Product.objects.values_list('id', 'created_at', 'quantity').iterator(chunk_size=5000):
+        opening = quantity - explained.get(product_id, 0)
+        if opening:
+            batch.append(StockMovement(product_id=product_id, delta=opening, reason='opening', created_at=created_at))
+    StockMovement.objects.bulk_create(batch, batch_size=5000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_product_tag_set'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('reason', models.CharField(choices=[('opening', 'Opening balance'), ('initial', 'Initial stock'), ('inbound', 'Inbound'), ('outbound', 'Outbound'), ('count', 'Cycle count'), ('edit', 'Manual edit')], max_length=10)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['product', 'created_at'], name='movement_product_created_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('product', 'taken_at'), name='unique_stock_snapshot')],
+            },
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:19
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_auditlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditlog',
+            name='changes',
+            field=models.JSONField(blank=True, default=dict, encoder=django.core.serializers.json.DjangoJSONEncoder),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='source_id',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='auditlog',
+            name='source_type',
+            field=models.CharField(blank=True, choices=[('inbound', 'Inbound transaction'), ('outbound', 'Outbound transaction'), ('cycle_count', 'Cycle count')], max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['product', '-timestamp', '-id'], name='auditlog_product_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['-timestamp', '-id'], name='auditlog_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_auditlog_changes_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('file', models.FileField(upload_to='audit_archive/')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('last_id', models.PositiveBigIntegerField()),
+                ('row_count', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['start', 'end'], name='auditarchive_range_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_auditarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(choices=[('open', 'Open'), ('reconciled', 'Reconciled'), ('cancelled', 'Cancelled')], default='open', max_length=10)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reconciled_at', models.DateTimeField(blank=True, null=True)),
+                ('summary', models.JSONField(blank=True, default=dict)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='cyclecount',
+            name='session',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='inventory.countsession'),
+        ),
+        migrations.CreateModel(
+            name='CountLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('snapshot_quantity', models.PositiveIntegerField()),
+                ('counted_quantity', models.PositiveIntegerField(blank=True, null=True)),
+                ('counted_by', models.CharField(blank=True, max_length=255)),
+                ('counted_at', models.DateTimeField(blank=True, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.product')),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='inventory.countsession')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('session', 'product'), name='unique_count_line')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_count_sessions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadjob',
+            name='resume_line',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 18:56
+
+import inventory.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_ledger_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', inventory.models.RoleUserManager()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='roles_changed_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,5 +1,29 @@
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
-from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
+from django.contrib.auth.models import AbstractUser, UserManager
+from django.dispatch import Signal
+
+# Saving any of these stamps User.roles_changed_at, which revokes the role
+# claims signed into the user's earlier tokens (see inventory.permissions).
+AUTH_FIELDS = frozenset({'role', 'is_active', 'is_staff', 'is_superuser'})
+
+# Sent with `user_ids` after a queryset update() touched AUTH_FIELDS, which
+# post_save never hears about.
+roles_changed = Signal()
+
+class UserQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        if not AUTH_FIELDS & set(kwargs):
+            return super().update(**kwargs)
+        user_ids = list(self.values_list('pk', flat=True))
+        kwargs.setdefault('roles_changed_at', timezone.now())
+        rows = super().update(**kwargs)
+        roles_changed.send(sender=self.model, user_ids=user_ids)
+        return rows
+
+class RoleUserManager(UserManager.from_queryset(UserQuerySet)):
+    pass
 
 class User(AbstractUser):
     ROLE_CHOICES = (
@@ -8,11 +32,33 @@ class User(AbstractUser):
         ('operator', 'Operator'),
     )
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='operator')
+    # When role, groups or account status last changed; tokens carry the value
+    # they were signed with and are only trusted while it still matches.
+    roles_changed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = RoleUserManager()
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if not self._state.adding and (update_fields is None or AUTH_FIELDS & set(update_fields)):
+            self.roles_changed_at = timezone.now()
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'roles_changed_at'}
+        super().save(*args, **kwargs)
+
+class Tag(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
 
 class Product(models.Model):
     name = models.CharField(max_length=255)
     sku = models.CharField(max_length=100, unique=True)
+    # `tags` stays the editable comma-separated string; `tag_set` is its
+    # normalized, indexed copy (see inventory.tags).
     tags = models.CharField(max_length=255, blank=True)
+    tag_set = models.ManyToManyField(Tag, blank=True, related_name='products')
     description = models.TextField(blank=True)
     category = models.CharField(max_length=100)
     quantity = models.PositiveIntegerField(default=0)
@@ -21,6 +67,21 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Support ProductViewSet's filters and orderings; the trigram indexes
+        # used by search are Postgres-only and live in migration 0006.
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['is_archived', '-created_at', '-id'], name='product_archived_created_idx'),
+            models.Index(
+                fields=['-created_at', '-id'],
+                condition=models.Q(quantity__lte=models.F('low_stock_threshold')),
+                name='product_low_stock_idx'
+            ),
+            models.Index(fields=['name', 'id'], name='product_name_idx'),
+            models.Index(fields=['quantity', 'id'], name='product_quantity_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -31,10 +92,29 @@ class AuditLog(models.Model):
         ('delete', 'Delete'),
     )
 
+    SOURCE_CHOICES = (
+        ('inbound', 'Inbound transaction'),
+        ('outbound', 'Outbound transaction'),
+        ('cycle_count', 'Cycle count'),
+    )
+
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     action = models.CharField(max_length=10, choices=ACTION_CHOICES)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is logged, not when the buffered write lands.
+    timestamp = models.DateTimeField(default=timezone.now)
     performed_by = models.CharField(max_length=255, default='System')  
+    # Changed fields only, as {"field": [before, after]}.
+    changes = models.JSONField(default=dict, blank=True, encoder=DjangoJSONEncoder)
+    # The transaction that caused the change. A plain type/id pair rather than
+    # foreign keys, so the link survives the transaction being deleted.
+    source_type = models.CharField(max_length=20, choices=SOURCE_CHOICES, blank=True)
+    source_id = models.PositiveBigIntegerField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', '-timestamp', '-id'], name='auditlog_product_ts_idx'),
+            models.Index(fields=['-timestamp', '-id'], name='auditlog_ts_idx'),
+        ]
 
     def __str__(self):
         return f"{self.performed_by} {self.action} {self.product.name} on {self.timestamp}"
@@ -72,8 +152,186 @@ class CycleCount(models.Model):
     adjusted = models.BooleanField(default=False)
     counted_by = models.CharField(max_length=255, default="admin")
     counted_at = models.DateTimeField(auto_now_add=True)
+    session = models.ForeignKey('CountSession', on_delete=models.SET_NULL, null=True, blank=True)
 
     def __str__(self):
         return f"{self.product.name} - Counted"
     
     
+
+class UploadJob(models.Model):
+    KIND_CHOICES = (
+        ('products', 'Products'),
+        ('inbounds', 'Inbounds'),
+        ('outbounds', 'Outbounds'),
+    )
+    STATUS_CHOICES = (
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    )
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    file = models.FileField(upload_to='upload_jobs/')
+    options = models.JSONField(default=dict, blank=True)
+    submitted_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    rows_processed = models.PositiveIntegerField(default=0)
+    rows_accepted = models.PositiveIntegerField(default=0)
+    rows_rejected = models.PositiveIntegerField(default=0)
+    # Last CSV line of the last committed batch; a requeued job resumes after it.
+    resume_line = models.PositiveIntegerField(default=0)
+    rejected = models.JSONField(default=list, blank=True)
+    summary = models.JSONField(default=dict, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Bumped by the worker after every committed batch; a running job whose
+    # heartbeat has gone quiet lost its worker and may be requeued.
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def elapsed_seconds(self):
+        if not self.started_at:
+            return 0
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed_seconds
+        return round(self.rows_processed / elapsed, 1) if elapsed else 0
+
+    def __str__(self):
+        return f"{self.kind} upload #{self.pk} ({self.status})"
+
+class DailyVolume(models.Model):
+    DIRECTION_CHOICES = (
+        ('inbound', 'Inbound'),
+        ('outbound', 'Outbound'),
+    )
+
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    direction = models.CharField(max_length=10, choices=DIRECTION_CHOICES)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['direction', 'date', 'product'], name='unique_daily_volume'),
+        ]
+
+    def __str__(self):
+        return f"{self.direction} {self.product_id} on {self.date}: {self.quantity}"
+
+class ForecastState(models.Model):
+    # Trailing window of daily outbound totals ending on the last dispatch day,
+    # kept up to date incrementally so forecasts are a single-row read.
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='forecast_state')
+    window = models.JSONField(default=list)
+    window_end = models.DateField(null=True, blank=True)
+    first_dispatch = models.DateField(null=True, blank=True)
+    daily_average = models.FloatField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Forecast state for {self.product_id}"
+
+class StockMovement(models.Model):
+    # Append-only ledger: every change to Product.quantity adds one row here
+    # (see inventory.stock), so past stock levels can be replayed.
+    REASON_CHOICES = (
+        ('opening', 'Opening balance'),
+        ('initial', 'Initial stock'),
+        ('inbound', 'Inbound'),
+        ('outbound', 'Outbound'),
+        ('count', 'Cycle count'),
+        ('edit', 'Manual edit'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=10, choices=REASON_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'created_at'], name='movement_product_created_idx'),
+            # take_snapshots reads the movements since its previous run.
+            models.Index(fields=['created_at'], name='movement_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.reason} {self.delta:+} for {self.product_id} at {self.created_at}"
+
+class StockSnapshot(models.Model):
+    # Stock on hand at `taken_at`, i.e. the sum of all movements up to then.
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'taken_at'], name='unique_stock_snapshot'),
+        ]
+        indexes = [
+            models.Index(fields=['taken_at'], name='snapshot_taken_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} at {self.taken_at}"
+
+class AuditArchive(models.Model):
+    # One gzip CSV of AuditLog rows moved out of the hot table (see
+    # inventory.archive); [start, end) bounds their timestamps.
+    file = models.FileField(upload_to='audit_archive/')
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    last_id = models.PositiveBigIntegerField()
+    row_count = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['start', 'end'], name='auditarchive_range_idx'),
+        ]
+
+    def __str__(self):
+        return f"Audit archive {self.start:%Y-%m-%d} - {self.end:%Y-%m-%d} ({self.row_count} rows)"
+
+class CountSession(models.Model):
+    # A blind count against stock frozen when the session opened; reconciling
+    # applies counted - snapshot to live stock (see inventory.counts).
+    STATUS_CHOICES = (
+        ('open', 'Open'),
+        ('reconciled', 'Reconciled'),
+        ('cancelled', 'Cancelled'),
+    )
+
+    name = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='open')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    reconciled_at = models.DateTimeField(null=True, blank=True)
+    summary = models.JSONField(default=dict, blank=True)
+
+    def __str__(self):
+        return f"Count session #{self.pk} ({self.status})"
+
+class CountLine(models.Model):
+    session = models.ForeignKey(CountSession, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    snapshot_quantity = models.PositiveIntegerField()
+    counted_quantity = models.PositiveIntegerField(null=True, blank=True)
+    counted_by = models.CharField(max_length=255, blank=True)
+    counted_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['session', 'product'], name='unique_count_line'),
+        ]
+
+    def __str__(self):
+        return f"Session {self.session_id} line for {self.product_id}"
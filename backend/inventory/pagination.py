@@ -0,0 +1,120 @@
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Cursor pagination keyed on (ordering field, id).
+
+    DRF's CursorPagination filters on the first ordering field only and walks
+    an offset through ties. Here `id` is always appended as a tie-breaker
+    and the cursor carries the full key, so every page is a
+    `WHERE (field, id) < (x, y) ... LIMIT n` lookup whatever its depth.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        # Prefer an explicit ?ordering=, then the queryset's own order_by().
+        if request.query_params.get('ordering') or not queryset.query.order_by:
+            ordering = super().get_ordering(request, queryset, view)
+        else:
+            ordering = tuple(queryset.query.order_by)
+
+        ordering = tuple(f for f in ordering if f.lstrip('-') not in ('id', 'pk'))
+        descending = ordering[0].startswith('-') if ordering else True
+        return ordering + ('-id' if descending else 'id',)
+
+    def _get_position_from_instance(self, instance, ordering):
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            value = instance[name] if isinstance(instance, dict) else getattr(instance, name)
+            values.append(str(value))
+        return json.dumps(values)
+
+    def get_ordering_field(self, queryset, name):
+        # The model field (or annotation) an ordering term refers to, following
+        # `__` lookups across relations.
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        model = queryset.model
+        for part in name.split('__'):
+            field = model._meta.pk if part == 'pk' else model._meta.get_field(part)
+            model = field.related_model
+        return field.target_field if field.is_relation else field
+
+    def keyset_filter(self, queryset, position, reverse):
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        # Lexicographic "after this key": (a > x) OR (a = x AND b > y) OR ...
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            # Cursor values come from the client, so a tampered one is a 404
+            # rather than a database error.
+            try:
+                value = self.get_ordering_field(queryset, name).to_python(value)
+            except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+            after = '__lt' if field.startswith('-') != reverse else '__gt'
+            condition |= equal & Q(**{name + after: value})
+            equal &= Q(**{name: value})
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        reverse = bool(self.cursor and self.cursor.reverse)
+        current_position = self.cursor.position if self.cursor else None
+
+        if reverse:
+            queryset = queryset.order_by(*[f[1:] if f.startswith('-') else '-' + f for f in self.ordering])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self.keyset_filter(queryset, current_position, reverse))
+
+        # Keys are unique, so cursors never need an offset.
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = current_position is not None
+            self.has_previous = following_position is not None
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = following_position is not None
+            self.has_previous = current_position is not None
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
@@ -1,13 +1,177 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth.models import Group
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
 from rest_framework.permissions import BasePermission
 
-class IsAdmin(BasePermission):
-    def has_permission(self, request, view):
-        return request.user and request.user.groups.filter(name='Admin').exists()
+from .models import AUTH_FIELDS, User, roles_changed
 
-class IsManager(BasePermission):
-    def has_permission(self, request, view):
-        return request.user and request.user.groups.filter(name='Manager').exists()
+# A user's roles are their User.role plus the names of their groups, lower-
+# cased ('admin', 'manager', 'operator'). They are signed into the JWT at
+# login together with the user's roles_changed_at, so a permission check
+# normally reads them straight off request.auth. A token is only trusted while
+# that stamp still matches the user row: changing the role, groups or account
+# status (active, staff, superuser) moves it, whether through save(), a
+# queryset update() or a group change. For untrusted tokens (and requests
+# without one) the roles come from a per-user cache entry. Refreshing a token
+# re-reads the roles from the database instead of copying them from the
+# refresh token (see RoleRefreshToken).
+#
+# The database holds the revocation state; the 'roles' cache only saves
+# re-reading the stamp on every request, and the signals below clear it on
+# every change.
+
+ROLES_KEY = 'user-roles:{id}'
+CHANGED_KEY = 'user-roles-changed:{id}'
+
+
+def get_timeout():
+    return getattr(settings, 'ROLE_CACHE_TIMEOUT', 3600)
+
+def get_cache():
+    return caches['roles']
+
+def load_roles(user):
+    return sorted({user.role, *(name.lower() for name in user.groups.values_list('name', flat=True))} - {''})
+
+def cached_roles(user):
+    key = ROLES_KEY.format(id=user.pk)
+    roles = get_cache().get(key)
+    if roles is None:
+        roles = load_roles(user)
+        get_cache().set(key, roles, get_timeout())
+    return frozenset(roles)
+
+def stamp(changed_at):
+    # The roles_changed_at claim: a POSIX timestamp, 0 for a user never changed.
+    return changed_at.timestamp() if changed_at else 0
+
+def role_claims(user_id):
+    """The user's current username, role, roles and roles_changed_at as token claims, read in one query; None if the user is gone."""
+    rows = list(User.objects.filter(pk=user_id).values_list('username', 'role', 'roles_changed_at', 'groups__name'))
+    if not rows:
+        return None
+    username, role, changed_at = rows[0][:3]
+    return {
+        'username': username,
+        'role': role,
+        'roles': sorted({role, *(group.lower() for *_, group in rows if group)} - {''}),
+        'roles_changed_at': stamp(changed_at),
+    }
+
+def roles_changed_at(user_id):
+    # None if the user no longer exists.
+    key = CHANGED_KEY.format(id=user_id)
+    changed = get_cache().get(key)
+    if changed is None:
+        rows = list(User.objects.filter(pk=user_id).values_list('roles_changed_at', flat=True))
+        if not rows:
+            return None
+        changed = stamp(rows[0])
+        get_cache().set(key, changed, get_timeout())
+    return changed
+
+def claims_current(user_id, token):
+    """True if the token's roles were signed since the user's role, groups or account last changed."""
+    if token is None or not hasattr(token, 'get') or token.get('roles') is None:
+        return False
+    signed = token.get('roles_changed_at')
+    return signed is not None and signed == roles_changed_at(user_id)
+
+def token_roles(user, token):
+    return frozenset(token['roles']) if claims_current(user.pk, token) else None
+
+def get_roles(request):
+    user = request.user
+    if not user or not user.is_authenticated:
+        return frozenset()
+    # Memoised on the request, so several permission classes share one lookup.
+    if not hasattr(request, '_roles'):
+        roles = token_roles(user, request.auth)
+        request._roles = roles if roles is not None else cached_roles(user)
+    return request._roles
+
+def forget_roles(ids):
+    get_cache().delete_many([key.format(id=pk) for pk in ids for key in (ROLES_KEY, CHANGED_KEY)])
+
+def roles_saved(user_ids):
+    # The new stamp is already written; drop the cached copies now, and again
+    # once the change commits so nothing read in between survives.
+    ids = list(user_ids)
+    if not ids:
+        return
+    forget_roles(ids)
+    transaction.on_commit(partial(forget_roles, ids))
+
+def invalidate_roles(user_ids):
+    """Stamp roles_changed_at for changes made outside User.save(), such as group membership."""
+    ids = list(user_ids)
+    if not ids:
+        return
+    User.objects.filter(pk__in=ids).update(roles_changed_at=timezone.now())
+    roles_saved(ids)
+
+
+class RolePermission(BasePermission):
+    role = None
 
-class IsOperator(BasePermission):
     def has_permission(self, request, view):
-        return request.user and request.user.groups.filter(name='Operator').exists()
+        return self.role in get_roles(request)
+
+class IsAdmin(RolePermission):
+    role = 'admin'
+
+class IsManager(RolePermission):
+    role = 'manager'
+
+class IsOperator(RolePermission):
+    role = 'operator'
+
+
+# -----------------------
+# Invalidation
+# -----------------------
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # User.save() stamps roles_changed_at under the same rule; logins save
+    # last_login only, which doesn't.
+    if created or (update_fields is not None and not AUTH_FIELDS & set(update_fields)):
+        return
+    roles_saved([instance.pk])
+
+@receiver(roles_changed, sender=User)
+def users_updated(sender, user_ids, **kwargs):
+    roles_saved(user_ids)
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    roles_saved([instance.pk])
+
+@receiver(m2m_changed, sender=User.groups.through)
+def user_groups_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_roles([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_roles(pk_set or [])
+    elif action == 'pre_clear':
+        # group.user_set.clear(): remember who was in it before it empties.
+        instance._cleared_user_ids = list(instance.user_set.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        invalidate_roles(getattr(instance, '_cleared_user_ids', []))
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_roles(instance.user_set.values_list('pk', flat=True))
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    # Before the delete, while the memberships still exist.
+    invalidate_roles(instance.user_set.values_list('pk', flat=True))
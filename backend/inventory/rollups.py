@@ -0,0 +1,80 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Q, Sum
+
+from .models import DailyVolume, ForecastState, InboundTransaction, OutboundTransaction
+from .forecasting import apply_usage_deltas
+
+KEY_CHUNK_SIZE = 300
+
+# Which date column each direction is bucketed by.
+SOURCES = {
+    'inbound': (InboundTransaction, 'received_date'),
+    'outbound': (OutboundTransaction, 'dispatch_date'),
+}
+
+
+def apply_volume_deltas(deltas):
+    """
+    Add {(direction, product_id, date): delta} to the DailyVolume rollup.
+    Missing rows are created first (ignoring races), then the touched rows are
+    locked and rewritten with one bulk_update, so concurrent writers never
+    lose an increment.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        DailyVolume.objects.bulk_create(
+            [DailyVolume(direction=d, product_id=p, date=day, quantity=0) for d, p, day in deltas],
+            ignore_conflicts=True
+        )
+        keys = list(deltas)
+        touched = []
+        for i in range(0, len(keys), KEY_CHUNK_SIZE):
+            match = Q()
+            for direction, product_id, day in keys[i:i + KEY_CHUNK_SIZE]:
+                match |= Q(direction=direction, product_id=product_id, date=day)
+            for row in DailyVolume.objects.select_for_update().filter(match).order_by('pk'):
+                row.quantity += deltas[(row.direction, row.product_id, row.date)]
+                touched.append(row)
+        DailyVolume.objects.bulk_update(touched, ['quantity'], batch_size=KEY_CHUNK_SIZE)
+
+        apply_usage_deltas({
+            (product_id, day): delta for (direction, product_id, day), delta in deltas.items() if direction == 'outbound'
+        })
+
+def record_volume(direction, transaction_obj, sign=1):
+    _, date_field = SOURCES[direction]
+    apply_volume_deltas({
+        (direction, transaction_obj.product_id, getattr(transaction_obj, date_field)): sign * transaction_obj.quantity
+    })
+
+def volume_deltas(direction, transactions):
+    _, date_field = SOURCES[direction]
+    deltas = defaultdict(int)
+    for t in transactions:
+        deltas[(direction, t.product_id, getattr(t, date_field))] += t.quantity
+    return deltas
+
+def rebuild_daily_volume(batch_size=5000):
+    # Full recompute from the transaction tables, grouped in the database.
+    # Forecast states derive from the rollup, so they are dropped as well.
+    with transaction.atomic():
+        DailyVolume.objects.all().delete()
+        ForecastState.objects.all().delete()
+        created = 0
+        for direction, (model, date_field) in SOURCES.items():
+            totals = model.objects.values('product_id', date_field).annotate(total=Sum('quantity')).order_by()
+            batch = []
+            for row in totals.iterator(chunk_size=batch_size):
+                batch.append(DailyVolume(
+                    direction=direction, product_id=row['product_id'], date=row[date_field], quantity=row['total']
+                ))
+                if len(batch) >= batch_size:
+                    created += len(DailyVolume.objects.bulk_create(batch))
+                    batch = []
+            created += len(DailyVolume.objects.bulk_create(batch))
+    return created
@@ -1,19 +1,38 @@
 from rest_framework import serializers
 from .models import Product, AuditLog
-from .models import InboundTransaction, OutboundTransaction
-from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .models import InboundTransaction, OutboundTransaction, UploadJob
+from .models import CountSession, CountLine
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from .ingest import UPSERT_FIELDS
+from .stock import set_stock
+from .labels import LABEL_KINDS
+from .permissions import role_claims
 
 class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
-        fields = '__all__'
+        exclude = ['tag_set']
+
+    def update(self, instance, validated_data):
+        # Write only the submitted columns, so editing e.g. the name can't
+        # overwrite a stock change made concurrently by a transaction. A
+        # quantity edit goes through the stock service and the ledger.
+        quantity = validated_data.pop('quantity', None)
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        if quantity is not None:
+            set_stock(instance, quantity, reason='edit')
+        return instance
 
 class AuditLogSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
 
     class Meta:
         model = AuditLog
-        fields = ['id', 'product', 'product_name', 'action', 'performed_by', 'timestamp']
+        fields = ['id', 'product', 'product_name', 'action', 'performed_by', 'timestamp', 'changes', 'source_type', 'source_id']
 
 class InboundTransactionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -32,7 +51,78 @@ class CycleCountSerializer(serializers.ModelSerializer):
         model = CycleCount
         fields = '__all__'
 
+class UploadJobSerializer(serializers.ModelSerializer):
+    submitted_by = serializers.CharField(source='submitted_by.username', read_only=True, default=None)
+    elapsed_seconds = serializers.FloatField(read_only=True)
+    rows_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = UploadJob
+        fields = [
+            'id', 'kind', 'status', 'submitted_by', 'options',
+            'rows_processed', 'rows_accepted', 'rows_rejected', 'rejected', 'summary', 'error',
+            'created_at', 'started_at', 'heartbeat_at', 'finished_at', 'elapsed_seconds', 'rows_per_second'
+        ]
+
+class ProductUploadOptionsSerializer(serializers.Serializer):
+    mode = serializers.ChoiceField(choices=['create', 'upsert'], default='create')
+    update_fields = serializers.CharField(required=False, allow_blank=True)
+    batch_size = serializers.IntegerField(required=False, min_value=100, max_value=10000)
+
+    def validate_update_fields(self, value):
+        fields = [f.strip() for f in value.split(',') if f.strip()]
+        unknown = set(fields) - set(UPSERT_FIELDS)
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown fields: {', '.join(sorted(unknown))}. Choose from {', '.join(UPSERT_FIELDS)}."
+            )
+        return fields
+
+class LabelSheetSerializer(serializers.Serializer):
+    skus = serializers.ListField(child=serializers.CharField(max_length=100), min_length=1, max_length=1000)
+    kind = serializers.ChoiceField(choices=LABEL_KINDS, default='barcode')
+    output = serializers.ChoiceField(choices=['pdf', 'png'], default='pdf')
+    columns = serializers.IntegerField(min_value=1, max_value=6, default=3)
+
+class CountSessionSerializer(serializers.ModelSerializer):
+    created_by = serializers.CharField(source='created_by.username', read_only=True, default=None)
+    line_count = serializers.IntegerField(read_only=True)
+    counted_count = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = CountSession
+        fields = ['id', 'name', 'status', 'created_by', 'started_at', 'reconciled_at', 'summary', 'line_count', 'counted_count']
+
+class CountSessionCreateSerializer(serializers.Serializer):
+    # Scope of the count; with neither, every active product is counted.
+    name = serializers.CharField(required=False, allow_blank=True, default='')
+    skus = serializers.ListField(child=serializers.CharField(max_length=100), required=False)
+    category = serializers.CharField(required=False)
+
+class CountLineSerializer(serializers.ModelSerializer):
+    sku = serializers.CharField(source='product.sku', read_only=True)
+    product_name = serializers.CharField(source='product.name', read_only=True)
+
+    class Meta:
+        model = CountLine
+        fields = ['id', 'product', 'sku', 'product_name', 'snapshot_quantity', 'counted_quantity', 'counted_by', 'counted_at']
+
+    def to_representation(self, instance):
+        # Counts are blind: the frozen quantity is only shown once the session is closed.
+        data = super().to_representation(instance)
+        if self.context.get('blind'):
+            data.pop('snapshot_quantity')
+        return data
+
 class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # Signed into the token so permission checks don't query the database.
+        token = super().get_token(user)
+        for claim, value in role_claims(user.pk).items():
+            token[claim] = value
+        return token
+
     def validate(self, attrs):
         data = super().validate(attrs)
         data['user'] = {
@@ -40,7 +130,20 @@ class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
             'role': self.user.role  
         }
 
-        data['access'] = str(self.get_token(self.user).access_token)
-        data['refresh'] = str(self.get_token(self.user))
+        return data
+class RoleRefreshToken(RefreshToken):
+    # Access tokens get the user's roles as they are now rather than a copy of
+    # this refresh token's, which may predate a role or group change.
+    @property
+    def access_token(self):
+        access = super().access_token
+        claims = role_claims(self.payload.get(api_settings.USER_ID_CLAIM))
+        for claim in ('username', 'role', 'roles', 'roles_changed_at'):
+            access.payload.pop(claim, None)
+        if claims:
+            for claim, value in claims.items():
+                access[claim] = value
+        return access
 
-        return data
\ No newline at end of file
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RoleRefreshToken
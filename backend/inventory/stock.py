@@ -0,0 +1,125 @@
+from datetime import timedelta
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, When, Value, F, IntegerField, Sum, Count, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Product, StockMovement, StockSnapshot
+
+UPDATE_CHUNK_SIZE = 500
+SNAPSHOT_CHUNK_SIZE = 2000
+# Snapshots stop this far in the past, so transactions still in flight when a
+# snapshot is taken can't commit movements behind it.
+SNAPSHOT_LAG = timedelta(minutes=5)
+
+# Every change to Product.quantity goes through here as a single
+# `UPDATE ... SET quantity = quantity + delta` (never a read-modify-write
+# save()), so concurrent requests can't overwrite each other's changes, and
+# each change is appended to the StockMovement ledger in the same transaction.
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product, requested, available):
+        self.product = product
+        self.requested = requested
+        self.available = available
+        super().__init__(f"Cannot remove {requested} of {product.sku}. Only {available} in stock.")
+
+
+def record_movements(deltas, reason):
+    StockMovement.objects.bulk_create(
+        [StockMovement(product_id=product_id, delta=delta, reason=reason) for product_id, delta in deltas.items() if delta],
+        batch_size=UPDATE_CHUNK_SIZE
+    )
+
+def adjust_stock(product, delta, reason):
+    """
+    Add `delta` (which may be negative) to the product's stock. A decrease only
+    applies if it keeps stock at or above zero; otherwise InsufficientStock is
+    raised and nothing changes. `product.quantity` is refreshed afterwards.
+    """
+    with transaction.atomic():
+        rows = Product.objects.filter(pk=product.pk)
+        if delta < 0:
+            rows = rows.filter(quantity__gte=-delta)
+        updated = rows.update(quantity=F('quantity') + delta, updated_at=timezone.now())
+        product.refresh_from_db(fields=['quantity', 'updated_at'])
+        if not updated:
+            raise InsufficientStock(product, -delta, product.quantity)
+        record_movements({product.pk: delta}, reason)
+    return product.quantity
+
+def set_stock(product, quantity, reason='count'):
+    """Overwrite the product's stock (e.g. after a count) and return what it was, read under a row lock."""
+    with transaction.atomic():
+        previous = Product.objects.select_for_update().values_list('quantity', flat=True).get(pk=product.pk)
+        if previous != quantity:
+            Product.objects.filter(pk=product.pk).update(quantity=quantity, updated_at=timezone.now())
+            record_movements({product.pk: quantity - previous}, reason)
+        product.refresh_from_db(fields=['quantity', 'updated_at'])
+    return previous
+
+def increment_stock(deltas, reason='inbound'):
+    """Apply {product_id: delta} as `quantity = quantity + delta` in chunked UPDATE statements."""
+    pks = list(deltas)
+    now = timezone.now()
+    for i in range(0, len(pks), UPDATE_CHUNK_SIZE):
+        chunk = pks[i:i + UPDATE_CHUNK_SIZE]
+        Product.objects.filter(pk__in=chunk).update(
+            quantity=F('quantity') + Case(
+                *[When(pk=pk, then=Value(deltas[pk])) for pk in chunk],
+                output_field=IntegerField()
+            ),
+            updated_at=now
+        )
+    record_movements(deltas, reason)
+
+
+# -----------------------
+# Point-in-time stock
+# -----------------------
+
+def take_snapshots(cutoff=None):
+    """
+    Snapshot every product whose stock moved since the previous run, as of
+    `cutoff` (default: now minus SNAPSHOT_LAG). Each run snapshots every
+    product that moved before its cutoff, so only the movements after the
+    previous run's cutoff are read, and each product's total is added to its
+    latest snapshot.
+    """
+    cutoff = min(cutoff, timezone.now()) if cutoff else timezone.now() - SNAPSHOT_LAG
+    previous = StockSnapshot.objects.filter(taken_at__lte=cutoff).aggregate(latest=Max('taken_at'))['latest']
+    movements = StockMovement.objects.filter(created_at__lte=cutoff)
+    if previous:
+        movements = movements.filter(created_at__gt=previous)
+    totals = movements.values('product_id').annotate(total=Sum('delta')).order_by('product_id').values_list('product_id', 'total')
+    latest = StockSnapshot.objects.filter(product_id=OuterRef('pk'), taken_at__lte=cutoff).order_by('-taken_at')
+
+    created = 0
+    rows = totals.iterator(chunk_size=SNAPSHOT_CHUNK_SIZE)
+    while batch := list(islice(rows, SNAPSHOT_CHUNK_SIZE)):
+        bases = dict(
+            Product.objects.filter(pk__in=[pk for pk, _ in batch])
+            .annotate(base=Subquery(latest.values('quantity')[:1])).values_list('pk', 'base')
+        )
+        snapshots = [
+            StockSnapshot(product_id=pk, taken_at=cutoff, quantity=(bases[pk] or 0) + total)
+            for pk, total in batch if pk in bases
+        ]
+        StockSnapshot.objects.bulk_create(snapshots, batch_size=SNAPSHOT_CHUNK_SIZE, ignore_conflicts=True)
+        created += len(snapshots)
+    return created
+
+def stock_at(product, ts):
+    """Stock on hand at `ts`: the nearest snapshot at or before it plus the movements since."""
+    snapshot = StockSnapshot.objects.filter(product=product, taken_at__lte=ts).order_by('-taken_at').first()
+    movements = StockMovement.objects.filter(product=product, created_at__lte=ts)
+    if snapshot:
+        movements = movements.filter(created_at__gt=snapshot.taken_at)
+    replay = movements.aggregate(total=Sum('delta'), count=Count('id'))
+    return {
+        'quantity': (snapshot.quantity if snapshot else 0) + (replay['total'] or 0),
+        'snapshot_at': snapshot.taken_at if snapshot else None,
+        'replayed_movements': replay['count'],
+    }
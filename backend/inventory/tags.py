@@ -0,0 +1,53 @@
+from django.db.models import Count, Exists, OuterRef
+
+from .models import Product, Tag
+
+ProductTag = Product.tag_set.through
+
+
+def parse_tags(value):
+    # "Red, outdoor,red " -> ['red', 'outdoor']
+    seen = []
+    for tag in (value or '').split(','):
+        tag = tag.strip().lower()[:100]
+        if tag and tag not in seen:
+            seen.append(tag)
+    return seen
+
+def sync_product_tags(tags_by_product):
+    """Rewrite the tag links for {product_id: tags string} with a fixed number of queries."""
+    if not tags_by_product:
+        return
+    parsed = {product_id: parse_tags(tags) for product_id, tags in tags_by_product.items()}
+    names = {name for tags in parsed.values() for name in tags}
+
+    Tag.objects.bulk_create([Tag(name=name) for name in names], ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'id'))
+
+    ProductTag.objects.filter(product_id__in=parsed).delete()
+    ProductTag.objects.bulk_create(
+        [ProductTag(product_id=product_id, tag_id=tag_ids[name]) for product_id, tags in parsed.items() for name in tags],
+        ignore_conflicts=True
+    )
+
+def filter_any_tags(queryset, names):
+    return queryset.filter(Exists(ProductTag.objects.filter(product_id=OuterRef('pk'), tag__name__in=names)))
+
+def filter_all_tags(queryset, names):
+    matching = (
+        ProductTag.objects.filter(tag__name__in=names)
+        .values('product_id')
+        .annotate(matched=Count('tag_id'))
+        .filter(matched=len(names))
+        .values('product_id')
+    )
+    return queryset.filter(pk__in=matching)
+
+def tag_facets(queryset):
+    # One grouped query over the link table, restricted to the filtered products.
+    return list(
+        ProductTag.objects.filter(product_id__in=queryset.values('pk'))
+        .values('tag__name')
+        .annotate(count=Count('product_id'))
+        .order_by('-count', 'tag__name')
+    )
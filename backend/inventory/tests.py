@@ -1,3 +1,783 @@
-from django.test import TestCase
+import base64
+import csv
+import io
+import json
+import tempfile
+import zipfile
+from datetime import date, datetime, time, timedelta
+from urllib.parse import urlencode
+from xml.etree import ElementTree
 
-# Create your tests here.
+from django.contrib.auth.models import Group
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    User, Product, InboundTransaction, OutboundTransaction, CycleCount, AuditLog, AuditArchive,
+    UploadJob, DailyVolume, ForecastState, CountSession, CountLine, StockMovement, StockSnapshot
+)
+from . import audit, labels
+from .authentication import ClaimsUser, StatelessJWTAuthentication
+from .permissions import IsAdmin, IsManager, IsOperator, token_roles
+from .serializers import CustomTokenObtainPairSerializer
+from .forecasting import get_forecast_state
+from .jobs import run_job
+from .ingest import ingest_outbounds, ingest_products, read_csv
+from .rollups import apply_volume_deltas
+from .utils import log_audit
+from .stock import InsufficientStock, adjust_stock, increment_stock, record_movements, set_stock, stock_at, take_snapshots
+
+# Query budgets for every list endpoint in inventory/urls.py. Each endpoint is
+# hit with a handful of rows and again with many more; the query count must
+# stay within its budget and must not grow with the number of rows, which is
+# what an N+1 looks like.
+QUERY_BUDGETS = {
+    'product-list': 1,
+    'product-tag-facets': 1,
+    'product-export': 1,
+    'auditlog-list': 1,
+    'auditlog-export': 1,
+    'auditlog-archived': 1,
+    'inboundtransaction-list': 1,
+    'inboundtransaction-export': 1,
+    'outboundtransaction-list': 1,
+    'outboundtransaction-export': 1,
+    'cyclecount-list': 1,
+    'cyclecount-export': 1,
+    'countsession-list': 1,
+    'uploadjob-list': 1,
+    'dashboard-summary': 4,
+    'daily-transactions': 2,
+    'forecast-batch': 2,
+}
+
+
+class ListQueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('budget', 'budget@example.com', 'pw', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.seeded = 0
+
+    def seed(self, n):
+        start = self.seeded
+        self.seeded += n
+        products = Product.objects.bulk_create([
+            Product(name=f'Product {i}', sku=f'SKU-{i}', category='tools', tags='red,tools', quantity=50)
+            for i in range(start, self.seeded)
+        ])
+        today = date.today()
+        InboundTransaction.objects.bulk_create([
+            InboundTransaction(product=p, supplier='Acme', quantity=5, received_date=today) for p in products
+        ])
+        OutboundTransaction.objects.bulk_create([
+            OutboundTransaction(product=p, customer='Shop', quantity=2, dispatch_date=today) for p in products
+        ])
+        CycleCount.objects.bulk_create([
+            CycleCount(product=p, counted_quantity=50, system_quantity=50, discrepancy=0) for p in products
+        ])
+        AuditLog.objects.bulk_create([
+            AuditLog(product=p, action='update', changes={'quantity': [45, 50]}, source_type='inbound', source_id=1)
+            for p in products
+        ])
+        UploadJob.objects.bulk_create([UploadJob(kind='products', submitted_by=self.user) for _ in products])
+        sessions = CountSession.objects.bulk_create([CountSession(created_by=self.user) for _ in products])
+        CountLine.objects.bulk_create([
+            CountLine(session=session, product=p, snapshot_quantity=50) for session in sessions for p in products
+        ])
+        DailyVolume.objects.bulk_create([
+            DailyVolume(product=p, direction=d, date=today, quantity=5) for p in products for d in ('inbound', 'outbound')
+        ])
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, url)
+        return len(queries)
+
+    def test_list_endpoints_stay_within_query_budget(self):
+        self.seed(3)
+        few = {name: self.count_queries(reverse(name)) for name in QUERY_BUDGETS}
+        self.seed(40)
+        many = {name: self.count_queries(reverse(name)) for name in QUERY_BUDGETS}
+
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(endpoint=name):
+                self.assertLessEqual(many[name], budget)
+                self.assertEqual(few[name], many[name])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('pager', role='operator'))
+        Product.objects.bulk_create([Product(name=f'Page {i}', sku=f'PAGE-{i}', category='tools') for i in range(5)])
+
+    def test_next_links_walk_every_row_once(self):
+        skus = []
+        url = reverse('product-list') + '?page_size=2&ordering=name'
+        while url:
+            data = self.client.get(url).json()
+            skus += [p['sku'] for p in data['results']]
+            url = data['next']
+        self.assertEqual(skus, [f'PAGE-{i}' for i in range(5)])
+
+    def test_tampered_cursor_is_not_found(self):
+        for position in (['not-a-date', 'x'], [{}, 1], ['2024-01-01T00:00:00+00:00', 'x']):
+            with self.subTest(position=position):
+                cursor = base64.b64encode(urlencode({'p': json.dumps(position)}).encode()).decode()
+                response = self.client.get(reverse('product-list'), {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+
+class ProductTagTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('tagger', role='manager'))
+        for sku, tags in [('TAG-1', 'Red, outdoor,red '), ('TAG-2', 'red'), ('TAG-3', 'blue,Outdoor')]:
+            response = self.client.post(reverse('product-list'), {'name': sku, 'sku': sku, 'category': 'tools', 'tags': tags}, format='json')
+            self.assertEqual(response.status_code, 201)
+
+    def skus(self, **params):
+        return sorted(p['sku'] for p in self.client.get(reverse('product-list'), params).json()['results'])
+
+    def test_tag_filters_match_normalized_names(self):
+        self.assertEqual(self.skus(tag='RED'), ['TAG-1', 'TAG-2'])
+        self.assertEqual(self.skus(tags_any='blue,red'), ['TAG-1', 'TAG-2', 'TAG-3'])
+        self.assertEqual(self.skus(tags_all='red,outdoor'), ['TAG-1'])
+
+    def test_edits_resync_tags_and_facets(self):
+        product = Product.objects.get(sku='TAG-2')
+        self.client.patch(reverse('product-detail', args=[product.pk]), {'tags': 'blue'}, format='json')
+        self.assertEqual(self.skus(tag='red'), ['TAG-1'])
+        facets = self.client.get(reverse('product-tag-facets')).json()
+        self.assertEqual(facets, [
+            {'tag__name': 'blue', 'count': 2}, {'tag__name': 'outdoor', 'count': 2}, {'tag__name': 'red', 'count': 1}
+        ])
+        self.assertEqual(self.client.get(reverse('product-tag-facets'), {'tag': 'outdoor'}).json()[0], {'tag__name': 'outdoor', 'count': 2})
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('exporter', role='manager'))
+        self.products = [
+            Product.objects.create(name=name, sku=f'EXP-{i}', category='tools', quantity=i)
+            for i, name in enumerate(['Plain', 'Comma, "quoted"', 'Ctrl\x01 <tag> & more'])
+        ]
+        InboundTransaction.objects.create(product=self.products[1], supplier='Acme', quantity=4, received_date=date(2025, 1, 2))
+
+    def export(self, name, **params):
+        response = self.client.get(reverse(name), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_csv_export_applies_filters(self):
+        rows = list(csv.reader(io.StringIO(self.export('product-export', search='EXP', ordering='quantity').decode())))
+        self.assertEqual(rows[0][:3], ['id', 'sku', 'name'])
+        self.assertEqual([row[2] for row in rows[1:]], ['Plain', 'Comma, "quoted"', 'Ctrl\x01 <tag> & more'])
+
+        rows = list(csv.reader(io.StringIO(self.export('inboundtransaction-export').decode())))
+        header = rows[0]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[1][header.index('sku')], 'EXP-1')
+
+    def test_xlsx_export_is_a_readable_workbook(self):
+        with zipfile.ZipFile(io.BytesIO(self.export('product-export', output='xlsx', ordering='quantity'))) as workbook:
+            sheet = ElementTree.fromstring(workbook.read('xl/worksheets/sheet1.xml'))
+        ns = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        rows = [[''.join(cell.itertext()) for cell in row] for row in sheet.iterfind('.//s:row', ns)]
+        self.assertEqual(len(rows), 4)
+        self.assertEqual([row[2] for row in rows[1:]], ['Plain', 'Comma, "quoted"', 'Ctrl <tag> & more'])
+        self.assertEqual(rows[3][6], '2')
+
+    def test_unknown_output_is_rejected(self):
+        self.assertEqual(self.client.get(reverse('product-export'), {'output': 'pdf'}).status_code, 400)
+
+
+class RolePermissionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        caches['roles'].clear()
+        self.user = User.objects.create_user('roles', 'roles@example.com', 'pw', role='operator')
+        self.factory = APIRequestFactory()
+
+    def check(self, permission, token=None):
+        request = Request(self.factory.get('/'))
+        request.user = self.user
+        request.auth = token
+        return permission().has_permission(request, None)
+
+    def login(self):
+        return CustomTokenObtainPairSerializer.get_token(self.user).access_token
+
+    def test_token_roles_need_no_queries(self):
+        self.user.groups.add(Group.objects.create(name='Manager'))
+        token = self.login()
+        # The first check reads the user's roles_changed_at stamp into the cache.
+        with self.assertNumQueries(1):
+            self.assertTrue(self.check(IsOperator, token))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.check(IsOperator, token))
+            self.assertTrue(self.check(IsManager, token))
+            self.assertFalse(self.check(IsAdmin, token))
+
+    def test_cached_roles_are_cleared_on_change(self):
+        self.assertFalse(self.check(IsManager))
+        with self.assertNumQueries(0):
+            self.assertFalse(self.check(IsManager))
+
+        token = self.login()
+        self.user.groups.add(Group.objects.create(name='Manager'))
+        self.assertTrue(self.check(IsManager))
+        self.assertTrue(self.check(IsManager, token))
+
+        self.user.role = 'admin'
+        self.user.save()
+        self.assertTrue(self.check(IsAdmin, token))
+        self.assertFalse(self.check(IsOperator, token))
+
+    def test_account_changes_revoke_token_roles(self):
+        changes = [
+            lambda: User.objects.filter(pk=self.user.pk).update(role='manager'),
+            lambda: User.objects.filter(pk=self.user.pk).update(is_active=False),
+            lambda: self.user.save(update_fields=['is_staff']),
+            lambda: self.user.save(),
+        ]
+        for change in changes:
+            with self.subTest(change=change):
+                self.user.refresh_from_db()
+                token = self.login()
+                self.assertIsNotNone(token_roles(self.user, token))
+                change()
+                self.assertIsNone(token_roles(self.user, token))
+
+    def test_unrelated_saves_keep_token_roles(self):
+        token = self.login()
+        self.user.save(update_fields=['last_login'])
+        User.objects.filter(pk=self.user.pk).update(email='new@example.com')
+        self.assertEqual(token_roles(self.user, token), {'operator'})
+
+    def test_refresh_signs_current_roles(self):
+        self.user.role = 'admin'
+        self.user.save()
+        refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+
+        self.user.role = 'operator'
+        self.user.save()
+        # Even once the change marker is gone, the old refresh token's roles aren't copied.
+        caches['roles'].clear()
+        response = APIClient().post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        self.assertEqual(response.status_code, 200)
+        token = AccessToken(response.json()['access'])
+        self.assertEqual(token['roles'], ['operator'])
+        self.assertFalse(self.check(IsAdmin, token))
+        self.assertTrue(self.check(IsOperator, token))
+
+
+class StatelessAuthenticationTests(TestCase):
+    def setUp(self):
+        caches['roles'].clear()
+        self.user = User.objects.create_user('scanner', 'scanner@example.com', 'pw', role='operator')
+
+    def authenticate(self, token):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return StatelessJWTAuthentication().authenticate(Request(request))[0]
+
+    def test_current_claims_need_no_queries(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.authenticate(token)
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.username, user.role), (self.user.pk, 'scanner', 'operator'))
+
+    def test_stale_claims_load_the_user(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.user.role = 'manager'
+        self.user.save()
+        user = self.authenticate(token)
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.role, 'manager')
+
+    def test_deactivated_user_is_refused(self):
+        token = CustomTokenObtainPairSerializer.get_token(self.user).access_token
+        self.assertIsInstance(self.authenticate(token), ClaimsUser)
+        self.user.is_active = False
+        self.user.save(update_fields=['is_active'])
+        # Revocation is read from the user row, so losing the cache doesn't undo it.
+        caches['roles'].clear()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_missing_claims_load_the_user(self):
+        with self.assertNumQueries(1):
+            user = self.authenticate(AccessToken.for_user(self.user))
+        self.assertIsInstance(user, User)
+        self.assertEqual(user.role, 'operator')
+
+    def test_refreshed_token_carries_current_claims(self):
+        refresh = CustomTokenObtainPairSerializer.get_token(self.user)
+        self.user.role = 'manager'
+        self.user.save()
+        caches['roles'].clear()
+        response = APIClient().post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+        user = self.authenticate(response.json()['access'])
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual(user.role, 'manager')
+
+
+class StockServiceTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Stocked', sku='STK-1', category='tools', quantity=10)
+
+    def ledger(self):
+        return list(StockMovement.objects.filter(product=self.product).order_by('pk').values_list('reason', 'delta'))
+
+    def test_stale_instances_add_up_instead_of_overwriting(self):
+        first = Product.objects.get(pk=self.product.pk)
+        second = Product.objects.get(pk=self.product.pk)
+        self.assertEqual(adjust_stock(first, -3, 'outbound'), 7)
+        self.assertEqual(adjust_stock(second, 5, 'inbound'), 12)
+        self.assertEqual(self.ledger(), [('outbound', -3), ('inbound', 5)])
+
+    def test_insufficient_stock_changes_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            adjust_stock(self.product, -11, 'outbound')
+        self.assertEqual((raised.exception.requested, raised.exception.available), (11, 10))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.assertEqual(self.ledger(), [])
+
+    def test_set_and_increment_record_the_difference(self):
+        other = Product.objects.create(name='Other', sku='STK-2', category='tools', quantity=1)
+        self.assertEqual(set_stock(self.product, 4), 10)
+        self.assertEqual(set_stock(self.product, 4), 4)
+        increment_stock({self.product.pk: 6, other.pk: -1})
+        self.assertEqual(dict(Product.objects.filter(sku__startswith='STK').values_list('sku', 'quantity')), {'STK-1': 10, 'STK-2': 0})
+        self.assertEqual(self.ledger(), [('count', -6), ('inbound', 6)])
+
+    def test_outbound_endpoint_refuses_to_oversell(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('dispatcher', role='operator'))
+        data = {'product': self.product.pk, 'customer': 'Shop', 'quantity': 11, 'dispatch_date': '2025-01-02'}
+        self.assertEqual(client.post(reverse('outboundtransaction-list'), data).status_code, 400)
+        data['quantity'] = 10
+        self.assertEqual(client.post(reverse('outboundtransaction-list'), data).status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 0)
+
+
+class StockSnapshotTests(TestCase):
+    def setUp(self):
+        self.products = Product.objects.bulk_create([
+            Product(name=f'Snap {i}', sku=f'SNAP-{i}', category='tools', quantity=20) for i in range(3)
+        ])
+        record_movements({p.pk: 20 for p in self.products}, 'initial')
+
+    def assert_replay_matches(self):
+        now = timezone.now()
+        for product in Product.objects.filter(pk__in=[p.pk for p in self.products]):
+            with self.subTest(product=product.sku):
+                self.assertEqual(stock_at(product, now)['quantity'], product.quantity)
+
+    def test_snapshot_plus_replay_equals_stock(self):
+        first, second, idle = self.products
+        adjust_stock(first, -5, 'outbound')
+        self.assertEqual(take_snapshots(timezone.now()), 3)
+
+        adjust_stock(first, 7, 'inbound')
+        set_stock(second, 3)
+        # Only the products that moved since the previous run get a snapshot.
+        self.assertEqual(take_snapshots(timezone.now()), 2)
+        self.assertEqual(StockSnapshot.objects.filter(product=idle).count(), 1)
+
+        adjust_stock(second, 4, 'inbound')
+        self.assert_replay_matches()
+        self.assertIsNotNone(stock_at(first, timezone.now())['snapshot_at'])
+
+    def test_stock_at_a_bare_date_means_the_end_of_that_day(self):
+        product = self.products[0]
+        day = timezone.localdate() - timedelta(days=1)
+        StockMovement.objects.filter(product=product).update(created_at=self.local(day - timedelta(days=1), 12))
+        StockMovement.objects.create(product=product, delta=-5, reason='outbound', created_at=self.local(day, 14))
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('viewer', role='operator'))
+        response = client.get(reverse('product-stock-at', args=[product.sku]), {'ts': day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['quantity'], 15)
+
+    def local(self, day, hour):
+        return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+class ForecastStateTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Forecast', sku='FC-1', category='tools', quantity=100)
+        self.today = date.today()
+        DailyVolume.objects.create(product=self.product, direction='outbound', date=self.today - timedelta(days=1), quantity=7)
+
+    def window(self):
+        return ForecastState.objects.get(product=self.product).window
+
+    def test_rebuild_then_increment_keeps_both(self):
+        state = get_forecast_state(self.product)
+        self.assertEqual(state.window[-1], 7)
+        apply_volume_deltas({('outbound', self.product.pk, self.today): 5})
+        self.assertEqual(self.window()[-2:], [7, 5])
+
+        # A forced rebuild reads the rollup, which already holds the increment.
+        self.product.refresh_from_db()
+        state = get_forecast_state(self.product, refresh=True)
+        self.assertEqual(state.window[-2:], [7, 5])
+        self.assertEqual(self.window(), state.window)
+        self.assertEqual(ForecastState.objects.filter(product=self.product).count(), 1)
+
+
+class AuditBufferTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Audited', sku='AUDIT-1', category='tools')
+
+    def actions(self):
+        return sorted(AuditLog.objects.filter(product=self.product).values_list('action', flat=True))
+
+    def test_rolled_back_savepoint_drops_only_its_entries(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                log_audit(self.product, 'before')
+                try:
+                    with transaction.atomic():
+                        log_audit(self.product, 'rolled-back')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                log_audit(self.product, 'after')
+        self.assertEqual(self.actions(), ['after', 'before'])
+
+    def test_released_savepoint_entries_survive(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                log_audit(self.product, 'outer')
+                with transaction.atomic():
+                    log_audit(self.product, 'inner')
+        self.assertEqual(self.actions(), ['inner', 'outer'])
+
+    def test_one_write_per_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            with transaction.atomic():
+                log_audit(self.product, 'first')
+                with transaction.atomic():
+                    log_audit(self.product, 'second')
+                log_audit(self.product, 'third')
+        # The live-product check and a single INSERT.
+        with self.assertNumQueries(2):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(self.actions(), ['first', 'second', 'third'])
+
+    def test_entries_wait_for_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            log_audit(self.product, 'pending')
+            self.assertEqual(self.actions(), [])
+        self.assertEqual(self.actions(), ['pending'])
+
+
+class AuditFlushTests(TransactionTestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Audited', sku='AUDIT-2', category='tools')
+
+    def actions(self):
+        return sorted(AuditLog.objects.filter(product=self.product).values_list('action', flat=True))
+
+    def test_outside_atomic_writes_immediately(self):
+        log_audit(self.product, 'now')
+        self.assertEqual(self.actions(), ['now'])
+
+    def test_rolled_back_transaction_leaves_nothing_behind(self):
+        try:
+            with transaction.atomic():
+                log_audit(self.product, 'rolled-back')
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        with transaction.atomic():
+            log_audit(self.product, 'committed')
+        self.assertEqual(self.actions(), ['committed'])
+
+    @override_settings(AUDIT_FLUSH_MODE='background')
+    def test_background_mode_drains(self):
+        with transaction.atomic():
+            log_audit(self.product, 'queued')
+        audit.get_writer().drain()
+        self.assertEqual(self.actions(), ['queued'])
+
+
+class AuditArchiveTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Archived', sku='ARC-1', category='tools')
+        self.moments = [timezone.make_aware(datetime(2024, month, day, 15)) for month, day in ((1, 10), (1, 20), (2, 5))]
+        AuditLog.objects.bulk_create(
+            [AuditLog(product=self.product, action='update', changes={'quantity': [i, i + 1]}, timestamp=moment)
+             for i, moment in enumerate(self.moments)]
+            + [AuditLog(product=self.product, action='create')]
+        )
+
+    def test_old_rows_move_to_monthly_archives_and_read_back(self):
+        call_command('archive_audit_log', days=30, batch_size=1, stdout=io.StringIO())
+        archives = list(AuditArchive.objects.order_by('start'))
+        for archive in archives:
+            self.addCleanup(archive.file.delete, save=False)
+        self.assertEqual([a.row_count for a in archives], [2, 1])
+        self.assertEqual(list(AuditLog.objects.values_list('action', flat=True)), ['create'])
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('auditor', role='manager'))
+        response = client.get(reverse('auditlog-archived'), {'start': '2024-01-20', 'end': '2024-02-05'})
+        rows = json.loads(b''.join(response.streaming_content))
+        self.assertEqual([row['changes'] for row in rows], [{'quantity': [1, 2]}, {'quantity': [2, 3]}])
+        self.assertEqual(rows[0]['product_id'], self.product.pk)
+
+
+class DailyTransactionVolumeTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('volume', role='manager'))
+
+    def test_non_numeric_product_is_rejected(self):
+        response = self.client.get(reverse('daily-transactions'), {'product': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BulkCycleCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('counter', role='operator'))
+        Product.objects.create(name='Counted', sku='COUNT-1', category='tools', quantity=5)
+
+    def test_json_rejections_report_the_item_index(self):
+        rows = [{'sku': 'COUNT-1', 'counted_quantity': 7}, {'sku': 'COUNT-1', 'counted_quantity': 'x'}]
+        response = self.client.post(reverse('cyclecount-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rejected'], [{'index': 1, 'sku': 'COUNT-1', 'error': "Invalid quantity 'x'"}])
+        self.assertEqual(Product.objects.get(sku='COUNT-1').quantity, 7)
+
+    def test_csv_rejections_report_the_line(self):
+        body = 'sku,counted_quantity\nCOUNT-1,7\nMISSING,3\n'
+        response = self.client.post(reverse('cyclecount-bulk'), body, content_type='text/csv')
+        self.assertEqual(response.json()['rejected'], [{'line': 3, 'sku': 'MISSING', 'error': "Unknown SKU 'MISSING'"}])
+
+    def test_numeric_sku_is_read_as_a_string(self):
+        Product.objects.create(name='Numeric', sku='123', category='tools', quantity=1)
+        response = self.client.post(reverse('cyclecount-bulk'), [{'sku': 123, 'counted_quantity': 4}], format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(Product.objects.get(sku='123').quantity, 4)
+
+    def test_non_object_items_are_rejected(self):
+        rows = [5, {'sku': 'COUNT-1', 'counted_quantity': 6}]
+        response = self.client.post(reverse('cyclecount-bulk'), rows, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rejected'], [{'index': 0, 'sku': None, 'error': 'Expected an object'}])
+        self.assertEqual(Product.objects.get(sku='COUNT-1').quantity, 6)
+
+
+class CountSessionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('counter', role='operator'))
+        self.products = [
+            Product.objects.create(name=f'Counted {i}', sku=f'CS-{i}', category='session', quantity=quantity)
+            for i, quantity in enumerate([10, 14, 3])
+        ]
+        response = self.client.post(reverse('countsession-list'), {'name': 'Aisle 1', 'category': 'session'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.session_id = response.json()['id']
+
+    def post_counts(self, rows):
+        return self.client.post(reverse('countsession-counts', args=[self.session_id]), rows, format='json')
+
+    def test_counts_reject_bad_items_and_accept_numeric_skus(self):
+        Product.objects.filter(sku='CS-1').update(sku='123')
+        response = self.post_counts([5, {'sku': 123, 'counted_quantity': 14}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accepted'], 1)
+        self.assertEqual(response.json()['rejected'], [{'index': 0, 'sku': None, 'error': 'Expected an object'}])
+
+    def test_reconcile_applies_the_discrepancy_to_live_stock(self):
+        # Snapshot is 10 / 14 / 3. Stock moves while counting: -2 on CS-0 and
+        # -3 on CS-2 (leaving 0), which the counts don't know about.
+        increment_stock({self.products[0].pk: -2, self.products[2].pk: -3}, 'outbound')
+        self.post_counts([
+            {'sku': 'CS-0', 'counted_quantity': 8},
+            {'sku': 'CS-1', 'counted_quantity': 14},
+            {'sku': 'CS-2', 'counted_quantity': 1},
+        ])
+
+        response = self.client.post(reverse('countsession-reconcile', args=[self.session_id]))
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()['summary']
+        self.assertEqual(
+            {k: summary[k] for k in ['counted', 'matched', 'short', 'net_discrepancy', 'moved_since_snapshot', 'floored']},
+            {'counted': 3, 'matched': 1, 'short': 2, 'net_discrepancy': -4, 'moved_since_snapshot': 2, 'floored': 1}
+        )
+        # 8 - 2 = 6, unchanged, and 0 - 2 floored to 0.
+        quantities = dict(Product.objects.filter(category='session').values_list('sku', 'quantity'))
+        self.assertEqual(quantities, {'CS-0': 6, 'CS-1': 14, 'CS-2': 0})
+        self.assertEqual(
+            list(StockMovement.objects.filter(reason='count').order_by('product_id').values_list('product__sku', 'delta')),
+            [('CS-0', -2)]
+        )
+        self.assertEqual(self.post_counts([{'sku': 'CS-0', 'counted_quantity': 1}]).status_code, 400)
+
+
+def csv_file(text):
+    return io.BytesIO(text.encode())
+
+
+class OutboundIngestTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(name='Dispatched', sku='OUT-1', category='tools', quantity=10)
+
+    def test_rows_that_would_oversell_are_rejected(self):
+        body = 'sku,customer,quantity,dispatch_date\nOUT-1,Shop,6,01/02/2025\nOUT-1,Shop,6,01/02/2025\nOUT-1,Shop,4,01/02/2025\n'
+        for batch_size in (100, 1):
+            with self.subTest(batch_size=batch_size):
+                Product.objects.filter(pk=self.product.pk).update(quantity=10)
+                report = ingest_outbounds(read_csv(csv_file(body)), batch_size=batch_size)
+                self.assertEqual(report['accepted'], 2)
+                self.assertEqual(
+                    report['rejected'],
+                    [{'line': 3, 'sku': 'OUT-1', 'error': 'Cannot dispatch 6 items. Only 4 in stock.'}]
+                )
+                self.product.refresh_from_db()
+                self.assertEqual(self.product.quantity, 0)
+
+
+class ProductUpsertTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name='Old name', sku='UP-1', category='tools', tags='red', description='Kept', low_stock_threshold=3, quantity=9
+        )
+
+    def test_partial_header_only_updates_its_columns(self):
+        report = ingest_products(read_csv(csv_file('sku,name\nUP-1,New name\nUP-2,Created\n')), mode='upsert')
+        self.assertEqual(report['summary'], {'updated': 1, 'created': 1})
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, 'New name')
+        self.assertEqual(
+            (self.product.tags, self.product.description, self.product.category, self.product.low_stock_threshold, self.product.quantity),
+            ('red', 'Kept', 'tools', 3, 9)
+        )
+        self.assertEqual(Product.objects.get(sku='UP-2').low_stock_threshold, 10)
+
+    def test_requested_fields_missing_from_the_file_are_ignored(self):
+        ingest_products(read_csv(csv_file('sku,name,tags\nUP-1,Old name,blue\n')), mode='upsert', update_fields=['tags', 'description'])
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.tags, self.product.description), ('blue', 'Kept'))
+
+
+class BulkUploadTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('uploader', role='manager'))
+        Product.objects.create(name='Received', sku='IN-1', category='tools', quantity=2)
+
+    def upload(self, name, body):
+        file = SimpleUploadedFile('upload.csv', body.encode(), content_type='text/csv')
+        response = self.client.post(reverse(name), {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 202)
+        job = UploadJob.objects.get(pk=response.json()['job']['id'])
+        self.addCleanup(job.file.delete, save=False)
+        run_job(job.pk)
+        job.refresh_from_db()
+        return job
+
+    @override_settings(INGEST_BATCH_SIZE=2)
+    def test_inbound_csv_is_applied_in_batches(self):
+        rows = ''.join(f'IN-1,Acme,{n},01/02/2025\n' for n in (1, 2, 3))
+        job = self.upload('inbound-upload', f'sku,supplier,quantity,received_date\n{rows}GHOST,Acme,1,01/02/2025\n')
+        self.assertEqual((job.status, job.rows_accepted, job.rows_rejected), ('completed', 3, 1))
+        self.assertEqual(job.rejected, [{'line': 5, 'sku': 'GHOST', 'error': "Unknown SKU 'GHOST'"}])
+        self.assertEqual(Product.objects.get(sku='IN-1').quantity, 8)
+        self.assertEqual(InboundTransaction.objects.filter(product__sku='IN-1').count(), 3)
+
+    def test_multibyte_text_across_chunk_boundaries(self):
+        # Well past one 64 KiB upload chunk, so some character straddles a boundary.
+        description = 'Caf\u00e9 \u2615 ' * 8000
+        job = self.upload('product-upload', f'sku,name,description,quantity\nUTF-1,Caf\u00e9,{description},1\n')
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual(Product.objects.get(sku='UTF-1').description, description)
+
+class UploadJobRequeueTests(TestCase):
+    def make_job(self, heartbeat_age, sku):
+        moment = timezone.now() - timedelta(seconds=heartbeat_age)
+        job = UploadJob(kind='products', status='running', started_at=moment, heartbeat_at=moment)
+        job.file.save(f'{sku}.csv', ContentFile(f'sku,name,quantity\n{sku},Requeued,4\n'.encode()), save=False)
+        job.save()
+        self.addCleanup(job.file.delete, save=False)
+        return job
+
+    def test_only_jobs_without_a_recent_heartbeat_are_requeued(self):
+        stale = self.make_job(3600, 'STALE-1')
+        busy = self.make_job(5, 'BUSY-1')
+        call_command('process_upload_jobs', requeue_running=True, stale_after=60, stdout=io.StringIO())
+
+        stale.refresh_from_db()
+        busy.refresh_from_db()
+        self.assertEqual((stale.status, stale.rows_accepted), ('completed', 1))
+        self.assertEqual(Product.objects.get(sku='STALE-1').quantity, 4)
+        self.assertEqual(busy.status, 'running')
+        self.assertFalse(Product.objects.filter(sku='BUSY-1').exists())
+
+
+class LabelCacheTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        labels.get_label.cache_clear()
+        self.addCleanup(labels.get_label.cache_clear)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('printer', role='operator'))
+        Product.objects.create(name='Labelled', sku='LBL-1', category='tools')
+
+    def test_known_skus_are_cached_and_revalidated(self):
+        url = reverse('generate-barcode', args=['LBL-1'])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+        self.assertTrue(labels.is_cached('barcode', 'LBL-1'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_skus_render_without_caching(self):
+        response = self.client.get(reverse('generate-qrcode', args=['NOPE-1']))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(labels.is_cached('qrcode', 'NOPE-1'))
+
+    def test_sheet_needs_known_skus(self):
+        response = self.client.post(reverse('label-sheet'), {'skus': ['LBL-1', 'NOPE-1']}, format='json')
+        self.assertEqual(response.json(), {'error': 'Unknown SKUs', 'skus': ['NOPE-1']})
+
+        response = self.client.post(reverse('label-sheet'), {'skus': ['LBL-1', 'LBL-1'], 'kind': 'qrcode'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertTrue(labels.is_cached('qrcode', 'LBL-1'))
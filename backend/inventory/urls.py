@@ -1,11 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import (
-    ProductViewSet, ProductBulkUploadView, AuditLogViewSet,
+    ProductViewSet, ProductBulkUploadView, UploadJobViewSet, AuditLogViewSet,
     InboundTransactionViewSet, InboundBulkUploadView,
     OutboundTransactionViewSet, OutboundBulkUploadView,
-    dashboard_summary, daily_transaction_volume, CycleCountViewSet,
-    generate_barcode, generate_qrcode, forecast_stock
+    dashboard_summary, dashboard_cache_stats, daily_transaction_volume, CycleCountViewSet, CountSessionViewSet,
+    generate_barcode, generate_qrcode, label_sheet, forecast_stock, forecast_stock_batch, product_stock_at
 )
 
 router = DefaultRouter()
@@ -14,6 +14,8 @@ router.register(r'audit-log', AuditLogViewSet, basename='auditlog')
 router.register(r'inbounds', InboundTransactionViewSet)
 router.register(r'outbounds', OutboundTransactionViewSet)
 router.register(r'cycle-counts', CycleCountViewSet)
+router.register(r'count-sessions', CountSessionViewSet)
+router.register(r'jobs', UploadJobViewSet)
 
 urlpatterns = [
     # API routers
@@ -26,12 +28,18 @@ urlpatterns = [
 
     # Dashboard and analytics
     path('dashboard-summary/', dashboard_summary, name='dashboard-summary'),
+    path('dashboard-summary/cache-stats/', dashboard_cache_stats, name='dashboard-cache-stats'),
     path('daily-transactions/', daily_transaction_volume, name='daily-transactions'),
 
+    # Point-in-time stock
+    path('products/<str:sku>/stock-at/', product_stock_at, name='product-stock-at'),
+
     # Barcode/QR
     path('products/<str:sku>/barcode/', generate_barcode, name='generate-barcode'),
     path('products/<str:sku>/qrcode/', generate_qrcode, name='generate-qrcode'),
+    path('labels/sheet/', label_sheet, name='label-sheet'),
 
     # Forecast
+    path('forecast/', forecast_stock_batch, name='forecast-batch'),
     path('forecast/<str:sku>/', forecast_stock, name='forecast-stock'),
 ]
@@ -1,12 +1,43 @@
-from .models import AuditLog
+from datetime import datetime, time
 
-def log_audit(product, action, user=None):
-    username = 'System'
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import audit
+
+def get_username(user=None):
     if user and hasattr(user, 'username'):
-        username = user.username
+        return user.username
+    return 'System'
+
+def parse_iso_date(value):
+    if not value:
+        return None
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+def parse_iso_datetime(value, end_of_day=True):
+    # Full ISO timestamps, or a bare YYYY-MM-DD meaning the end (or start) of
+    # that day. Naive values are read in the current time zone.
+    if not value:
+        return None
+    # parse_datetime() also accepts a bare date (as midnight), so dates are
+    # checked first.
+    day = parse_date(value)
+    if day is not None:
+        moment = datetime.combine(day, time.max if end_of_day else time.min)
+    else:
+        moment = parse_datetime(value)
+    if moment is None:
+        raise ValueError(f"Invalid timestamp '{value}'")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+def log_audit(product, action, user=None, changes=None, source=None):
+    # Buffered: written in one bulk insert when the transaction commits.
+    audit.record([audit.make_entry(product, action, get_username(user), changes, source)])
 
-    AuditLog.objects.create(
-        product=product,
-        action=action,
-        performed_by=username
-    )
+def log_audit_bulk(entries, action, user=None):
+    """`entries` yields (product, changes, source) for each audited change."""
+    username = get_username(user)
+    audit.record([audit.make_entry(product, action, username, changes, source) for product, changes, source in entries])
@@ -3,58 +3,90 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.exceptions import ValidationError
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, action
 from rest_framework.permissions import IsAuthenticated
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.utils import timezone
-from django.db import models
-from django.db.models import F, Sum
-from django.db.models.functions import TruncDate
-from django.http import HttpResponse
-from io import StringIO, BytesIO
-import csv
-import barcode
-from barcode.writer import ImageWriter
-import qrcode
-import pandas as pd
-from datetime import datetime
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 
 from .permissions import IsAdmin, IsManager, IsOperator
-from .utils import log_audit
+from .filters import ProductSearchFilter
+from .exports import ExportMixin
+from .tags import parse_tags, sync_product_tags, filter_any_tags, filter_all_tags, tag_facets
+from .utils import log_audit, parse_iso_date, parse_iso_datetime
+from .audit import diff, stock_change
+from .archive import read_archive
+from .labels import get_label, is_cached, label_etag, render_label, render_sheet
+from .jobs import enqueue_job
+from .ingest import IngestReport, ingest_counts
+from .counts import SessionClosed, open_session, record_counts, reconcile_session, cancel_session
+from .dashboard import get_summary, get_cache_stats
+from .rollups import record_volume
+from .stock import InsufficientStock, adjust_stock, set_stock, record_movements, stock_at
+from .forecasting import (
+    DEFAULT_FORECASTER, get_forecaster, daily_usage_matrix, daily_averages,
+    forecast_products, get_forecast_state, stream_json, stream_csv
+)
 from .models import (
     Product, 
     InboundTransaction, OutboundTransaction,
-    CycleCount, AuditLog
+    CycleCount, AuditLog, UploadJob, DailyVolume, CountSession
 )
 from .serializers import (
     ProductSerializer, AuditLogSerializer,
     InboundTransactionSerializer, OutboundTransactionSerializer,
-    CycleCountSerializer,
-    CustomTokenObtainPairSerializer
+    CycleCountSerializer, UploadJobSerializer, ProductUploadOptionsSerializer, LabelSheetSerializer,
+    CountSessionSerializer, CountSessionCreateSerializer, CountLineSerializer,
+    CustomTokenObtainPairSerializer, CustomTokenRefreshSerializer
 )
 
+# Rendered labels never change for a SKU; clients may reuse them for a day
+# and revalidate with the ETag after that.
+LABEL_MAX_AGE = 60 * 60 * 24
+
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+
+class CustomTokenRefreshView(TokenRefreshView):
+    serializer_class = CustomTokenRefreshSerializer
     
 # -----------------------
 # Product CRUD + Bulk Upload
 # -----------------------
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all().order_by('-created_at')
     serializer_class = ProductSerializer
-    filter_backends = [filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [ProductSearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'sku', 'category', 'tags']
-    ordering_fields = ['name', 'quantity']
+    ordering_fields = ['name', 'quantity', 'created_at']
+    ordering = ['-created_at']
     permission_classes = [IsAuthenticated]
+    export_filename = 'products'
+    export_fields = [
+        ('id', 'id'), ('sku', 'sku'), ('name', 'name'), ('category', 'category'), ('tags', 'tags'),
+        ('description', 'description'), ('quantity', 'quantity'), ('low_stock_threshold', 'low_stock_threshold'),
+        ('is_archived', 'is_archived'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    ]
 
+    @transaction.atomic
     def perform_create(self, serializer):
         product = serializer.save()
+        sync_product_tags({product.pk: product.tags})
+        record_movements({product.pk: product.quantity}, 'initial')
         log_audit(product, 'create', self.request.user)
 
+    @transaction.atomic
     def perform_update(self, serializer):
+        fields = list(serializer.validated_data)
+        before = {f: getattr(serializer.instance, f) for f in fields}
         product = serializer.save()
-        log_audit(product, 'update', self.request.user)
+        sync_product_tags({product.pk: product.tags})
+        log_audit(product, 'update', self.request.user, changes=diff(before, {f: getattr(product, f) for f in fields}))
 
     def perform_destroy(self, instance):
         log_audit(instance, 'delete', self.request.user)
@@ -71,65 +103,123 @@ class ProductViewSet(viewsets.ModelViewSet):
         elif is_archived == 'false':
             qs = qs.filter(is_archived=False)
 
+        # Exact, normalized tag filters: ?tag=red, ?tags_any=red,blue, ?tags_all=red,blue
+        tag = self.request.query_params.get('tag')
+        if tag:
+            qs = filter_any_tags(qs, parse_tags(tag))
+        tags_any = parse_tags(self.request.query_params.get('tags_any'))
+        if tags_any:
+            qs = filter_any_tags(qs, tags_any)
+        tags_all = parse_tags(self.request.query_params.get('tags_all'))
+        if tags_all:
+            qs = filter_all_tags(qs, tags_all)
+
         return qs
 
-class ProductBulkUploadView(APIView):
+    @action(detail=False, url_path='tag-facets')
+    def tag_facets(self, request):
+        # Tag counts for the products matching the current filters and search.
+        return Response(tag_facets(self.filter_queryset(self.get_queryset())))
+
+class BulkUploadView(APIView):
+    # The CSV is stored as an UploadJob and processed by the background worker
+    # pool; clients poll /api/jobs/<id>/ for progress.
     parser_classes = [MultiPartParser]
+    kind = None
+    success_message = 'Bulk upload queued'
+
+    def get_options(self, request):
+        return {}
 
     def post(self, request, format=None):
         file = request.FILES.get('file')
         if not file:
             return Response({'error': 'No file uploaded'}, status=400)
 
-        decoded_file = file.read().decode('utf-8')
-        reader = csv.DictReader(StringIO(decoded_file))
-
-        products = [
-            Product(
-                name=row['name'],
-                sku=row['sku'],
-                tags=row.get('tags', ''),
-                description=row.get('description', ''),
-                category=row.get('category', ''),
-                quantity=int(row['quantity']),
-                low_stock_threshold=int(row.get('low_stock_threshold', 10)),
-                is_archived=False  
-            ) for row in reader
-        ]
-        Product.objects.bulk_create(products)
-        return Response({'message': 'Bulk upload successful'})
+        options = self.get_options(request)
+        job = UploadJob.objects.create(
+            kind=self.kind,
+            file=file,
+            options=options,
+            submitted_by_id=request.user.pk if request.user.is_authenticated else None
+        )
+        enqueue_job(job)
+        return Response({'message': self.success_message, 'job': UploadJobSerializer(job).data}, status=status.HTTP_202_ACCEPTED)
+
+class ProductBulkUploadView(BulkUploadView):
+    # mode=upsert updates existing SKUs in place (only `update_fields`,
+    # comma separated) instead of rejecting them.
+    kind = 'products'
+
+    def get_options(self, request):
+        options = ProductUploadOptionsSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        return options.validated_data
+
+class UploadJobViewSet(viewsets.ReadOnlyModelViewSet):
+    queryset = UploadJob.objects.select_related('submitted_by').order_by('-created_at')
+    serializer_class = UploadJobSerializer
+    permission_classes = [IsAuthenticated]
 
 # -----------------------
 # Audit Logs
 # -----------------------
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+class AuditLogViewSet(ExportMixin, viewsets.ReadOnlyModelViewSet):
     queryset = AuditLog.objects.all().order_by('-timestamp')
     serializer_class = AuditLogSerializer
     permission_classes = [IsAuthenticated]
+    export_filename = 'audit-log'
+    export_fields = [
+        ('id', 'id'), ('product', 'product_id'), ('product_sku', 'product__sku'), ('product_name', 'product__name'),
+        ('action', 'action'), ('performed_by', 'performed_by'), ('timestamp', 'timestamp'),
+    ]
 
     def get_queryset(self):
-        qs = AuditLog.objects.all().order_by('-timestamp')
+        # product_name comes from the same query rather than one lookup per row.
+        qs = AuditLog.objects.select_related('product').only(
+            'id', 'product__name', 'action', 'performed_by', 'timestamp', 'changes', 'source_type', 'source_id'
+        ).order_by('-timestamp')
         product_id = self.request.query_params.get('product_id')
         if product_id:
             qs = qs.filter(product_id=product_id)
         return qs
 
+    @action(detail=False, url_path='archived')
+    def archived(self, request):
+        # Rows moved out by archive_audit_log, read back from the archive files
+        # that overlap ?start=&end= (ISO timestamps or YYYY-MM-DD), streamed as JSON.
+        try:
+            start = parse_iso_datetime(request.query_params.get('start'), end_of_day=False)
+            end = parse_iso_datetime(request.query_params.get('end'))
+        except ValueError:
+            return Response({'error': 'start and end must be ISO 8601 timestamps or YYYY-MM-DD dates'}, status=400)
+        rows = read_archive(start, end, request.query_params.get('product_id'))
+        return StreamingHttpResponse(stream_json(rows), content_type='application/json')
+
 # -----------------------
 # Inbound Transactions
 # -----------------------
 
-class InboundTransactionViewSet(viewsets.ModelViewSet):
+class InboundTransactionViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = InboundTransaction.objects.all().order_by('-created_at')
     serializer_class = InboundTransactionSerializer
     parser_classes = [MultiPartParser, FormParser]
+    export_filename = 'inbounds'
+    export_fields = [
+        ('id', 'id'), ('product', 'product_id'), ('sku', 'product__sku'), ('product_name', 'product__name'),
+        ('supplier', 'supplier'), ('quantity', 'quantity'), ('invoice_reference', 'invoice_reference'),
+        ('received_date', 'received_date'), ('attachment', 'attachment'), ('created_at', 'created_at'),
+    ]
 
+    @transaction.atomic
     def perform_create(self, serializer):
         inbound = serializer.save()
-        inbound.product.quantity += inbound.quantity
-        inbound.product.save()
-        log_audit(inbound.product, 'update', self.request.user)
+        adjust_stock(inbound.product, inbound.quantity, 'inbound')
+        record_volume('inbound', inbound)
+        log_audit(inbound.product, 'update', self.request.user, stock_change(inbound.product, inbound.quantity), inbound)
 
+    @transaction.atomic
     def perform_update(self, serializer):
         instance = self.get_object()
         old_quantity = instance.quantity
@@ -137,77 +227,70 @@ class InboundTransactionViewSet(viewsets.ModelViewSet):
 
         updated = serializer.save()
 
+        # (product, delta) for each product whose stock this edit moves.
         if old_product != updated.product:
-            old_product.quantity -= old_quantity
-            old_product.save()
-
-            updated.product.quantity += updated.quantity
-            updated.product.save()
+            changes = [(old_product, -old_quantity), (updated.product, updated.quantity)]
         else:
-            delta = updated.quantity - old_quantity
-            updated.product.quantity += delta
-            updated.product.save()
-
-        log_audit(updated.product, 'update', self.request.user)
-
+            changes = [(updated.product, updated.quantity - old_quantity)]
+        try:
+            for product, delta in changes:
+                adjust_stock(product, delta, 'inbound')
+        except InsufficientStock as e:
+            raise ValidationError(f"Cannot reduce this inbound. Only {e.available} of {e.product.sku} left in stock.")
+
+        record_volume('inbound', instance, sign=-1)
+        record_volume('inbound', updated)
+        for product, delta in changes:
+            log_audit(product, 'update', self.request.user, stock_change(product, delta), updated)
+
+    @transaction.atomic
     def perform_destroy(self, instance):
         product = instance.product
-        product.quantity -= instance.quantity
-        product.save()
-        log_audit(product, 'update', self.request.user)
+        try:
+            adjust_stock(product, -instance.quantity, 'inbound')
+        except InsufficientStock as e:
+            raise ValidationError(f"Cannot delete this inbound. Only {e.available} of {product.sku} left in stock.")
+        record_volume('inbound', instance, sign=-1)
+        log_audit(product, 'update', self.request.user, stock_change(product, -instance.quantity), instance)
         instance.delete()
 
-class InboundBulkUploadView(APIView):
-    parser_classes = [MultiPartParser]
-
-    def post(self, request, format=None):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'error': 'No file uploaded'}, status=400)
-
-        decoded_file = file.read().decode('utf-8')
-        reader = csv.DictReader(StringIO(decoded_file))
-
-        for row in reader:
-            try:
-                product = Product.objects.get(sku=row['sku'])
-
-                inbound = InboundTransaction.objects.create(
-                    product=product,
-                    supplier=row.get('supplier', ''),
-                    quantity=int(row['quantity']),
-                    invoice_reference=row.get('invoice_reference', ''),
-                    received_date=datetime.strptime(row['received_date'], "%m/%d/%Y").date()
-                )
-                product.quantity += inbound.quantity
-                product.save()
-                log_audit(product, 'update', request.user if request.user.is_authenticated else None)
-            except Product.DoesNotExist:
-                continue 
-
-        return Response({'message': 'Bulk inbound upload successful'})
+class InboundBulkUploadView(BulkUploadView):
+    kind = 'inbounds'
+    success_message = 'Bulk inbound upload queued'
 
 
 # -----------------------
 # Outbound Transactions
 # -----------------------
 
-class OutboundTransactionViewSet(viewsets.ModelViewSet):
+class OutboundTransactionViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = OutboundTransaction.objects.all().order_by('-created_at')
     serializer_class = OutboundTransactionSerializer
     parser_classes = [MultiPartParser, FormParser]
+    export_filename = 'outbounds'
+    export_fields = [
+        ('id', 'id'), ('product', 'product_id'), ('sku', 'product__sku'), ('product_name', 'product__name'),
+        ('customer', 'customer'), ('quantity', 'quantity'), ('so_reference', 'so_reference'),
+        ('dispatch_date', 'dispatch_date'), ('attachment', 'attachment'), ('created_at', 'created_at'),
+    ]
+
+    # Stock checks happen inside the guarded UPDATE, and each method runs in
+    # one transaction so a rejected dispatch leaves no outbound row behind.
 
+    @transaction.atomic
     def perform_create(self, serializer):
         outbound = serializer.save()
         product = outbound.product
 
-        if outbound.quantity > product.quantity:
-            raise ValidationError(f"Cannot dispatch {outbound.quantity} items. Only {product.quantity} in stock.")
+        try:
+            adjust_stock(product, -outbound.quantity, 'outbound')
+        except InsufficientStock as e:
+            raise ValidationError(f"Cannot dispatch {outbound.quantity} items. Only {e.available} in stock.")
 
-        product.quantity -= outbound.quantity
-        product.save()
-        log_audit(product, 'update', self.request.user)
+        record_volume('outbound', outbound)
+        log_audit(product, 'update', self.request.user, stock_change(product, -outbound.quantity), outbound)
 
+    @transaction.atomic
     def perform_update(self, serializer):
         instance = self.get_object()
         old_quantity = instance.quantity
@@ -216,62 +299,36 @@ class OutboundTransactionViewSet(viewsets.ModelViewSet):
         updated = serializer.save()
 
         if old_product != updated.product:
-            old_product.quantity += old_quantity
-            old_product.save()
-
-            if updated.quantity > updated.product.quantity:
-                raise ValidationError(f"Cannot dispatch {updated.quantity}. Only {updated.product.quantity} in stock.")
-            updated.product.quantity -= updated.quantity
-            updated.product.save()
+            changes = [(old_product, old_quantity), (updated.product, -updated.quantity)]
+            adjust_stock(old_product, old_quantity, 'outbound')
+            try:
+                adjust_stock(updated.product, -updated.quantity, 'outbound')
+            except InsufficientStock as e:
+                raise ValidationError(f"Cannot dispatch {updated.quantity}. Only {e.available} in stock.")
         else:
             delta = updated.quantity - old_quantity
-            if delta > updated.product.quantity:
-                raise ValidationError(f"Cannot dispatch additional {delta}. Only {updated.product.quantity} in stock.")
-            updated.product.quantity -= delta
-            updated.product.save()
+            changes = [(updated.product, -delta)]
+            try:
+                adjust_stock(updated.product, -delta, 'outbound')
+            except InsufficientStock as e:
+                raise ValidationError(f"Cannot dispatch additional {delta}. Only {e.available} in stock.")
 
-        log_audit(updated.product, 'update', self.request.user)
+        record_volume('outbound', instance, sign=-1)
+        record_volume('outbound', updated)
+        for product, delta in changes:
+            log_audit(product, 'update', self.request.user, stock_change(product, delta), updated)
 
+    @transaction.atomic
     def perform_destroy(self, instance):
         product = instance.product
-        product.quantity += instance.quantity
-        product.save()
-        log_audit(product, 'update', self.request.user)
+        adjust_stock(product, instance.quantity, 'outbound')
+        record_volume('outbound', instance, sign=-1)
+        log_audit(product, 'update', self.request.user, stock_change(product, instance.quantity), instance)
         instance.delete()
 
-class OutboundBulkUploadView(APIView):
-    parser_classes = [MultiPartParser]
-
-    def post(self, request, format=None):
-        file = request.FILES.get('file')
-        if not file:
-            return Response({'error': 'No file uploaded'}, status=400)
-
-        decoded_file = file.read().decode('utf-8')
-        reader = csv.DictReader(StringIO(decoded_file))
-
-        for row in reader:
-            try:
-                product = Product.objects.get(sku=row['sku'])
-                qty = int(row['quantity'])
-
-                if qty > product.quantity:
-                    continue
-
-                outbound = OutboundTransaction.objects.create(
-                    product=product,
-                    customer=row['customer'],
-                    quantity=qty,
-                    so_reference=row.get('so_reference', ''),
-                    dispatch_date=datetime.strptime(row['dispatch_date'], "%m/%d/%Y").date()
-                )
-                product.quantity -= qty
-                product.save()
-                log_audit(product, 'update', request.user if request.user.is_authenticated else None)
-            except Product.DoesNotExist:
-                continue
-
-        return Response({'message': 'Bulk outbound upload successful'})
+class OutboundBulkUploadView(BulkUploadView):
+    kind = 'outbounds'
+    success_message = 'Bulk outbound upload queued'
 
 # -----------------------
 # Forecasting + Dashboard
@@ -279,66 +336,86 @@ class OutboundBulkUploadView(APIView):
 
 @api_view(['GET'])
 def dashboard_summary(request):
-    today = timezone.now().date()
-    total_products = Product.objects.count()
-    inbound_today = InboundTransaction.objects.filter(received_date=today).aggregate(total=Sum('quantity'))['total'] or 0
-    outbound_today = OutboundTransaction.objects.filter(dispatch_date=today).aggregate(total=Sum('quantity'))['total'] or 0
-    low_stock_count = Product.objects.filter(quantity__lte=models.F('low_stock_threshold')).count()
-
-    recent_activities = AuditLog.objects.all().order_by('-timestamp')[:10]
-    recent_data = [
-        {
-            'product': a.product.name,
-            'action': a.action,
-            'performed_by': a.performed_by,
-            'timestamp': a.timestamp
-        } for a in recent_activities
-    ]
+    summary, hit = get_summary()
+    response = Response(summary)
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
 
-    return Response({
-        'total_products': total_products,
-        'inbound_today': inbound_today,
-        'outbound_today': outbound_today,
-        'low_stock_alerts': low_stock_count,
-        'recent_activities': recent_data
-    })
+@api_view(['GET'])
+def dashboard_cache_stats(request):
+    return Response(get_cache_stats())
 
 @api_view(['GET'])
 def daily_transaction_volume(request):
-    inbound = InboundTransaction.objects.annotate(date=TruncDate('received_date')).values('date').annotate(total=Sum('quantity')).order_by('date')
-    outbound = OutboundTransaction.objects.annotate(date=TruncDate('dispatch_date')).values('date').annotate(total=Sum('quantity')).order_by('date')
+    # Reads the DailyVolume rollup; optional ?start=&end= (YYYY-MM-DD) and
+    # ?product=<id> or ?sku= filters.
+    qs = DailyVolume.objects.exclude(quantity=0)
+    try:
+        start = parse_iso_date(request.query_params.get('start'))
+        end = parse_iso_date(request.query_params.get('end'))
+    except ValueError:
+        return Response({'error': 'start and end must be dates in YYYY-MM-DD format'}, status=400)
+    if start:
+        qs = qs.filter(date__gte=start)
+    if end:
+        qs = qs.filter(date__lte=end)
+
+    product_id = request.query_params.get('product')
+    if product_id:
+        if not product_id.isdigit():
+            return Response({'error': 'product must be a numeric product id'}, status=400)
+        qs = qs.filter(product_id=int(product_id))
+    sku = request.query_params.get('sku')
+    if sku:
+        qs = qs.filter(product__sku=sku)
+
+    def totals(direction):
+        return list(qs.filter(direction=direction).values('date').annotate(total=Sum('quantity')).order_by('date'))
 
     return Response({
-        'inbound': list(inbound),
-        'outbound': list(outbound)
+        'inbound': totals('inbound'),
+        'outbound': totals('outbound')
     })
 
 @api_view(['GET'])
 def forecast_stock(request, sku):
+    # The default rolling mean reads the precomputed ForecastState
+    # (?refresh=true forces a full recompute); other ?model= choices are
+    # computed from the product's history on the fly.
+    try:
+        forecaster = get_forecaster(request.query_params.get('model'))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
     try:
-        product = Product.objects.get(sku=sku)
+        product = Product.objects.select_related('forecast_state').get(sku=sku)
     except Product.DoesNotExist:
         return Response({"error": "Product not found"}, status=404)
 
-    data = OutboundTransaction.objects.filter(product=product).values('dispatch_date', 'quantity')
-    if not data:
-        return Response({"message": "Not enough data to forecast"}, status=400)
-
-    df = pd.DataFrame(list(data))
-    df['dispatch_date'] = pd.to_datetime(df['dispatch_date'])
-    df = df.groupby('dispatch_date').sum().resample('D').sum().fillna(0)
-    df['rolling_avg'] = df['quantity'].rolling(window=7, min_periods=1).mean()
+    if forecaster.name == DEFAULT_FORECASTER:
+        state = get_forecast_state(product, refresh=request.query_params.get('refresh') == 'true')
+        if state.window_end is None:
+            return Response({"message": "Not enough data to forecast"}, status=400)
+        avg_daily_use = state.daily_average
+        computed_at = state.computed_at
+    else:
+        matrix = daily_usage_matrix(Product.objects.filter(pk=product.pk))
+        if matrix.empty:
+            return Response({"message": "Not enough data to forecast"}, status=400)
+        avg_daily_use = float(daily_averages(matrix, forecaster).iloc[0])
+        computed_at = timezone.now()
 
     current_stock = product.quantity
-    avg_daily_use = df['rolling_avg'].iloc[-1]
 
     if avg_daily_use == 0:
         return Response({
             "sku": product.sku,
             "product": product.name,
             "stock": current_stock,
+            "model": forecaster.name,
             "daily_average": 0,
-            "forecast_days_left": "∞ (no usage)"
+            "forecast_days_left": "∞ (no usage)",
+            "computed_at": computed_at
         })
 
     days_left = int(current_stock / avg_daily_use)
@@ -346,51 +423,211 @@ def forecast_stock(request, sku):
         "sku": product.sku,
         "product": product.name,
         "stock": current_stock,
+        "model": forecaster.name,
         "daily_average": round(avg_daily_use, 2),
-        "forecast_days_left": days_left
+        "forecast_days_left": days_left,
+        "computed_at": computed_at
     })
 
+@api_view(['GET'])
+def forecast_stock_batch(request):
+    # Forecast every (non-archived) product in one vectorized pass, streamed
+    # as JSON or, with ?output=csv, as CSV. ?category= and
+    # ?include_archived=true narrow or widen the product set; ?model= picks
+    # the forecaster.
+    try:
+        forecaster = get_forecaster(request.query_params.get('model'))
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    products = Product.objects.all()
+    if request.query_params.get('include_archived') != 'true':
+        products = products.filter(is_archived=False)
+    category = request.query_params.get('category')
+    if category:
+        products = products.filter(category=category)
+
+    results = forecast_products(products.order_by('sku'), forecaster)
+
+    if request.query_params.get('output') == 'csv':
+        response = StreamingHttpResponse(stream_csv(results), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="forecast.csv"'
+        return response
+    return StreamingHttpResponse(stream_json(results), content_type='application/json')
+
+@api_view(['GET'])
+def product_stock_at(request, sku):
+    # Stock on hand at ?ts= (ISO timestamp, or YYYY-MM-DD for end of day),
+    # from the nearest StockSnapshot plus the ledger movements after it.
+    try:
+        ts = parse_iso_datetime(request.query_params.get('ts'))
+    except ValueError:
+        ts = None
+    if ts is None:
+        return Response({'error': 'ts must be an ISO 8601 timestamp or a YYYY-MM-DD date'}, status=400)
+
+    try:
+        product = Product.objects.only('id', 'sku', 'name').get(sku=sku)
+    except Product.DoesNotExist:
+        return Response({"error": "Product not found"}, status=404)
+
+    return Response({'sku': product.sku, 'product': product.name, 'ts': ts, **stock_at(product, ts)})
+
 # -----------------------
 # Cycle Count
 # -----------------------
 
-class CycleCountViewSet(viewsets.ModelViewSet):
+def ingest_report(request):
+    # Parsed CSV bodies are reported by line number (header = line 1), JSON
+    # lists by each item's 0-based index.
+    return IngestReport(position='line' if request.content_type.startswith('text/csv') else 'index')
+
+class CycleCountViewSet(ExportMixin, viewsets.ModelViewSet):
     queryset = CycleCount.objects.all().order_by('-counted_at')
     serializer_class = CycleCountSerializer
+    export_filename = 'cycle-counts'
+    export_fields = [
+        ('id', 'id'), ('product', 'product_id'), ('sku', 'product__sku'), ('product_name', 'product__name'),
+        ('counted_quantity', 'counted_quantity'), ('system_quantity', 'system_quantity'),
+        ('discrepancy', 'discrepancy'), ('reason', 'reason'), ('adjusted', 'adjusted'),
+        ('counted_by', 'counted_by'), ('counted_at', 'counted_at'),
+    ]
 
+    @transaction.atomic
     def perform_create(self, serializer):
         product = serializer.validated_data['product']
         counted = serializer.validated_data['counted_quantity']
-        system = product.quantity
+        # The system quantity is read under the same row lock that applies the count.
+        system = set_stock(product, counted)
         discrepancy = counted - system
         counted_by = self.request.user.username if self.request.user.is_authenticated else 'admin'
 
-        serializer.save(
+        count = serializer.save(
             system_quantity=system,
             discrepancy=discrepancy,
             counted_by=counted_by
         )
 
         if discrepancy != 0:
-            product.quantity = counted
-            product.save()
+            log_audit(product, 'update', self.request.user, {'quantity': [system, counted]}, count)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        # A JSON list of {"sku", "counted_quantity", "reason"} objects, or a
+        # text/csv body with those columns. Every row is applied in one
+        # transaction; the response carries the rejected rows and a
+        # discrepancy summary.
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'detail': 'Expected a list of counts.'})
+        return Response(ingest_counts(rows, request.user, report=ingest_report(request)))
+
+# -----------------------
+# Count sessions
+# -----------------------
+
+class CountSessionViewSet(viewsets.ReadOnlyModelViewSet):
+    # Blind counts against stock frozen when the session opened, so the dock
+    # keeps working while people count: POST a scope to open one, POST counts
+    # to <id>/counts/ (JSON list or CSV, like cycle-counts/bulk/), then
+    # <id>/reconcile/ applies counted - snapshot to live stock.
+    queryset = CountSession.objects.select_related('created_by').annotate(
+        line_count=Count('lines'),
+        counted_count=Count('lines', filter=Q(lines__counted_quantity__isnull=False))
+    ).order_by('-started_at')
+    serializer_class = CountSessionSerializer
+
+    def create(self, request):
+        scope = CountSessionCreateSerializer(data=request.data)
+        scope.is_valid(raise_exception=True)
+        products = Product.objects.filter(is_archived=False)
+        if 'skus' in scope.validated_data:
+            products = Product.objects.filter(sku__in=scope.validated_data['skus'])
+        if 'category' in scope.validated_data:
+            products = products.filter(category=scope.validated_data['category'])
+
+        session = open_session(products, scope.validated_data['name'], request.user)
+        return Response(self.get_serializer(self.get_queryset().get(pk=session.pk)).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['get'])
+    def lines(self, request, pk=None):
+        session = self.get_object()
+        lines = session.lines.select_related('product').order_by('id')
+        if request.query_params.get('uncounted') == 'true':
+            lines = lines.filter(counted_quantity__isnull=True)
+        page = self.paginate_queryset(lines)
+        serializer = CountLineSerializer(page, many=True, context={'blind': session.status == 'open'})
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['post'])
+    def counts(self, request, pk=None):
+        rows = request.data
+        if not isinstance(rows, list):
+            raise ValidationError({'detail': 'Expected a list of counts.'})
+        try:
+            return Response(record_counts(self.get_object(), rows, request.user, report=ingest_report(request)))
+        except SessionClosed as e:
+            raise ValidationError({'detail': str(e)})
+
+    @action(detail=True, methods=['post'])
+    def reconcile(self, request, pk=None):
+        try:
+            session = reconcile_session(self.get_object(), request.user)
+        except SessionClosed as e:
+            raise ValidationError({'detail': str(e)})
+        return Response(self.get_serializer(self.get_queryset().get(pk=session.pk)).data)
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        try:
+            session = cancel_session(self.get_object())
+        except SessionClosed as e:
+            raise ValidationError({'detail': str(e)})
+        return Response(self.get_serializer(self.get_queryset().get(pk=session.pk)).data)
 
 # -----------------------
 # Barcode / QR Code
 # -----------------------
 
+def label_response(request, kind, sku):
+    # The ETag is derived from the SKU alone, so a revalidation is answered
+    # without loading or rendering the image.
+    etag = label_etag(kind, sku)
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        # Unknown SKUs are rendered but never written to the label cache.
+        if is_cached(kind, sku) or Product.objects.filter(sku=sku).exists():
+            png = get_label(kind, sku)
+        else:
+            png = render_label(kind, sku)
+        response = HttpResponse(png, content_type='image/png')
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=LABEL_MAX_AGE)
+    return response
+
 @api_view(['GET'])
 def generate_barcode(request, sku):
-    buffer = BytesIO()
-    bcode = barcode.get_barcode_class('code128')(sku, writer=ImageWriter())
-    bcode.write(buffer)
-    buffer.seek(0)
-    return HttpResponse(buffer, content_type='image/png')
+    return label_response(request, 'barcode', sku)
 
 @api_view(['GET'])
 def generate_qrcode(request, sku):
-    qr = qrcode.make(sku)
-    buffer = BytesIO()
-    qr.save(buffer, format='PNG')
-    buffer.seek(0)
-    return HttpResponse(buffer, content_type='image/png')
+    return label_response(request, 'qrcode', sku)
+
+@api_view(['POST'])
+def label_sheet(request):
+    # {"skus": [...], "kind": "barcode"|"qrcode", "output": "pdf"|"png", "columns": 3}
+    options = LabelSheetSerializer(data=request.data)
+    options.is_valid(raise_exception=True)
+    skus = options.validated_data['skus']
+
+    known = set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True))
+    unknown = [sku for sku in dict.fromkeys(skus) if sku not in known]
+    if unknown:
+        return Response({'error': 'Unknown SKUs', 'skus': unknown}, status=400)
+
+    output = options.validated_data['output']
+    sheet = render_sheet(options.validated_data['kind'], skus, options.validated_data['columns'], output)
+    response = HttpResponse(sheet, content_type='application/pdf' if output == 'pdf' else 'image/png')
+    response['Content-Disposition'] = f'attachment; filename="labels.{output}"'
+    return response
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -97,17 +98,47 @@ TIME_ZONE = 'UTC'
 USE_I18N = True
 USE_TZ = True
 
+# Cache
+# File-based by default so every gunicorn worker on the host shares one cache
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'wms_cache')),
+        # Django's default of 300 culls random entries (dashboard summaries included) far too early
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))},
+    },
+    # Copies of users' role sets and roles_changed_at stamps; revocation itself lives in the user table.
+    # With several hosts, point this at a cache they all share or a revocation takes up to ROLE_CACHE_TIMEOUT to reach the others
+    'roles': {
+        'BACKEND': os.getenv('ROLE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.getenv('ROLE_CACHE_LOCATION', os.path.join(tempfile.gettempdir(), 'wms_roles_cache')),
+        'OPTIONS': {'MAX_ENTRIES': int(os.getenv('ROLE_CACHE_MAX_ENTRIES', 10000))},
+    },
+}
+
+# Seconds a cached dashboard summary may live; writes invalidate it sooner
+DASHBOARD_CACHE_TIMEOUT = int(os.getenv('DASHBOARD_CACHE_TIMEOUT', 60))
+
+# Seconds a user's cached role set and roles_changed_at stamp may live; role and group changes clear them sooner
+ROLE_CACHE_TIMEOUT = int(os.getenv('ROLE_CACHE_TIMEOUT', 3600))
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = 'static/'
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Build request.user from the JWT's signed claims instead of loading the User row
+JWT_STATELESS_AUTH = os.getenv('JWT_STATELESS_AUTH') == 'True'
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'inventory.authentication.StatelessJWTAuthentication' if JWT_STATELESS_AUTH
+        else 'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
     
+    'DEFAULT_PAGINATION_CLASS': 'inventory.pagination.KeysetCursorPagination',
+
     'DEFAULT_PARSER_CLASSES': (
         'rest_framework.parsers.JSONParser',
         'rest_framework_csv.parsers.CSVParser',
@@ -126,3 +157,24 @@ SIMPLE_JWT = {
 }
 
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Rows per database batch for the streaming CSV bulk uploads
+INGEST_BATCH_SIZE = int(os.getenv('INGEST_BATCH_SIZE', 2000))
+
+# Worker threads per process for queued bulk upload jobs
+UPLOAD_JOB_WORKERS = int(os.getenv('UPLOAD_JOB_WORKERS', 2))
+
+# Seconds a running upload job may go without committing a batch before process_upload_jobs --requeue-running takes it over
+UPLOAD_JOB_STALE_SECONDS = int(os.getenv('UPLOAD_JOB_STALE_SECONDS', 600))
+
+# Audit entries are written in bulk when each transaction commits ('commit'),
+# or handed to a background writer thread ('background') for high-rate traffic
+AUDIT_FLUSH_MODE = os.getenv('AUDIT_FLUSH_MODE', 'commit')
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 1.0))
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 1000))
+
+# AuditLog rows older than this are moved to gzip archives by archive_audit_log
+AUDIT_RETENTION_DAYS = int(os.getenv('AUDIT_RETENTION_DAYS', 365))
+
+# Processes used to render batch label sheets (default: one per CPU)
+LABEL_RENDER_WORKERS = int(os.getenv('LABEL_RENDER_WORKERS', 0)) or None
@@ -2,8 +2,7 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from inventory.views import CustomTokenObtainPairView
+from inventory.views import CustomTokenObtainPairView, CustomTokenRefreshView
 from django.http import HttpResponse 
 
 def home(request):
@@ -14,7 +13,7 @@ urlpatterns = [
     path('', home),  
     path('api/', include('inventory.urls')),
     path('api/token/', CustomTokenObtainPairView.as_view(), name='token_obtain_pair'),
-    path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/refresh/', CustomTokenRefreshView.as_view(), name='token_refresh'),
 ]
 
 urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
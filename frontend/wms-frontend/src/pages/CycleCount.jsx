@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { hasPermission } from "../utils/permission";
+import { fetchAllPages } from "../utils/pagination";
 
 function CycleCount() {
   const navigate = useNavigate();
@@ -25,11 +26,8 @@ function CycleCount() {
   }, []);
 
   const fetchProducts = async () => {
-    const res = await fetch("http://127.0.0.1:8000/api/products/?is_archived=false", {
-      headers: { Authorization: `Bearer ${token}` },
-    });
-    const data = await res.json();
-    setProducts(data.results || data);
+    const items = await fetchAllPages("http://127.0.0.1:8000/api/products/?is_archived=false&page_size=1000", token);
+    setProducts(items);
   };
 
   const fetchCounts = async () => {
@@ -37,7 +35,7 @@ function CycleCount() {
       headers: { Authorization: `Bearer ${token}` },
     });
     const data = await res.json();
-    setCounts(data);
+    setCounts(data.results || data);
   };
 
   const handleProductChange = (productId) => {
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from "react";
 import { useNavigate } from "react-router-dom";
 import { hasPermission } from "../utils/permission";
+import { fetchAllPages } from "../utils/pagination";
 
 function Forecast() {
   const navigate = useNavigate();
@@ -14,11 +15,8 @@ function Forecast() {
   }, []);
 
   const fetchProducts = async () => {
-    const res = await fetch("http://127.0.0.1:8000/api/products/?is_archived=false", {
-      headers: { Authorization: `Bearer ${token}` },
-    });
-    const data = await res.json();
-    setProducts(data.results || data);
+    const items = await fetchAllPages("http://127.0.0.1:8000/api/products/?is_archived=false&page_size=1000", token);
+    setProducts(items);
   };
 
   const handleFetchForecast = async () => {
@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { hasPermission } from "../utils/permission";
+import { fetchAllPages } from "../utils/pagination";
 
 function Inventory() {
   const navigate = useNavigate();
@@ -35,19 +36,18 @@ function Inventory() {
     try {
       let url = `http://127.0.0.1:8000/api/products/?search=${search}&page_size=1000`;
       url += `&is_archived=${showArchived ? "true" : "false"}`;
-      const res = await fetch(url, {
-        headers: {
-          Authorization: `Bearer ${token}`,
-        },
-      });
-      if (res.status === 401 || res.status === 403) {
-        alert("Session expired. Please login again.");
-        localStorage.removeItem("access_token");
-        window.location.href = "/login";
-        return;
+      let items;
+      try {
+        items = await fetchAllPages(url, token);
+      } catch (error) {
+        if (error.status === 401 || error.status === 403) {
+          alert("Session expired. Please login again.");
+          localStorage.removeItem("access_token");
+          window.location.href = "/login";
+          return;
+        }
+        throw error;
       }
-      const data = await res.json();
-      const items = data.results || data;
       setProducts(Array.isArray(items) ? items : []);
       setLoading(false);
     } catch (error) {
@@ -65,7 +65,7 @@ function Inventory() {
         },
       });
       const data = await res.json();
-      setAuditLogs(data);
+      setAuditLogs(data.results || data);
       setShowLogs(true);
     } catch (error) {
       console.error("Failed to fetch logs:", error);
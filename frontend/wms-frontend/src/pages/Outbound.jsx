@@ -2,6 +2,7 @@ import React, { useEffect, useState } from "react";
 import { Html5QrcodeScanner } from "html5-qrcode";
 import { useNavigate } from "react-router-dom"; 
 import { hasPermission } from "../utils/permission";
+import { fetchAllPages } from "../utils/pagination";
 
 function Outbound() {
   const navigate = useNavigate();
@@ -55,11 +56,8 @@ function Outbound() {
   }, [scanning, products]);
 
   const fetchProducts = async () => {
-    const res = await fetch("http://127.0.0.1:8000/api/products/?is_archived=false", {
-      headers: { Authorization: `Bearer ${token}` },
-    });
-    const data = await res.json();
-    setProducts(data.results || data);
+    const items = await fetchAllPages("http://127.0.0.1:8000/api/products/?is_archived=false&page_size=1000", token);
+    setProducts(items);
   };
 
   const fetchOutbounds = async () => {
@@ -67,7 +65,7 @@ function Outbound() {
       headers: { Authorization: `Bearer ${token}` },
     });
     const data = await res.json();
-    setOutbounds(data);
+    setOutbounds(data.results || data);
   };
 
   const handleSubmit = async (e) => {
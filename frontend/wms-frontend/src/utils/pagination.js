@@ -0,0 +1,20 @@
+// List endpoints are cursor-paginated: follow `next` until the last page.
+export const fetchAllPages = async (url, token) => {
+  let items = [];
+  let next = url;
+  while (next) {
+    const res = await fetch(next, {
+      headers: { Authorization: `Bearer ${token}` },
+    });
+    if (!res.ok) {
+      const error = new Error(`Request failed with status ${res.status}`);
+      error.status = res.status;
+      throw error;
+    }
+    const data = await res.json();
+    if (!data.results) return data;
+    items = items.concat(data.results);
+    next = data.next;
+  }
+  return items;
+};